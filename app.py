@@ -1,27 +1,59 @@
 # app.py
-from flask import Flask, render_template, redirect, url_for, flash, request, session
+from flask import Flask, abort, current_app, render_template, redirect, url_for, flash, request, session, make_response, jsonify
+from flask.cli import AppGroup
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
+from flask_wtf.csrf import generate_csrf, validate_csrf
+from wtforms.validators import ValidationError
 from flask_login import LoginManager, login_user, current_user, logout_user, login_required
-from config import Config
-from models import db, User, Score
-from forms import SignupForm, LoginForm, SelectCategoryForm
-from questions import questions
-from wtforms import RadioField, SubmitField
-from wtforms.validators import DataRequired
-from flask_wtf import FlaskForm
-from supabase import create_client, Client
-from datetime import datetime, timezone
+from config import Config, describe
+from models import (db, User, Score, UserStats, UserCategoryStats, UploadJob, record_score, rebuild_user_stats,
+                    rebuild_rollups, refresh_score_rollups)
+from forms import SignupForm, LoginForm, SelectCategoryForm, get_exam_form_class
+from datetime import datetime, timedelta, timezone
+import hmac
+import io
+import click
+from functools import wraps
 from sqlalchemy import func
-from questions import questions, get_section_questions, get_section_author  # Add helper functions
+from questions import question_bank
+from grading import grading_engine
+from user_cache import UserCache, user_cache, invalidate_user
+from supabase_tokens import SupabaseTokenAuth, TokenVerifier, TokenRefresher, supabase_login_required
+from supabase_transport import SupabaseUnavailable, build_caller
+from supabase_backends import LazyClient, create_supabase_client, local_jwt_secret
+from uploads import StreamingUploader, UploadBusy, UploadRejected
+from upload_worker import UploadWorker
+from storage_backends import FilesystemStorage, create_storage
+from avatars import (IMMUTABLE_CACHE_SECONDS, avatar_dir, content_hash, make_variants, variant_url,
+                     variants_available)
+from exam_fragments import get_exam_fragment
+from trends import academy_trend, user_trend
+from timeseries import DOWNSAMPLERS
+from synthetic import generate_dataset
+from query_stats import QueryStats
+from rankings import (AVERAGE, DEFAULT_SORT, bump_leaderboard_generation, cached_leaderboard_page,
+                      leaderboard_etag, leaderboard_rank, leaderboard_version, parse_cursor)
+import rankings
+from metrics import CONTENT_TYPE, Metrics, cache_lines, operation_lines, pool_lines
+from profiler import RequestProfiler
 
 
-app = Flask(__name__)
-app.config.from_object(Config)
-
 # ---------------------- Helper functions ---------------------- #
 
-def get_total_score(user_id):
-    scores = Score.query.filter_by(user_id=user_id).all()
-    return sum(s.score for s in scores) if scores else 0
+def get_user_stats(user_id):
+    """Materialized aggregates for a user (None until their first exam)."""
+    return db.session.get(UserStats, user_id)
+
+def csrf_token_valid():
+    """Check the submitted CSRF token without instantiating a form."""
+    if not current_app.config.get('WTF_CSRF_ENABLED', True):
+        return True
+    try:
+        validate_csrf(request.form.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')))
+        return True
+    except ValidationError:
+        return False
 
 def get_performance_remark(total_score, total_exams):
     if total_exams == 0:
@@ -38,90 +70,190 @@ def get_performance_remark(total_score, total_exams):
     else:
         return "Keep Practicing! 💪"
 
-# Supabase client
-supabase: Client = create_client(
-    app.config['SUPABASE_URL'],
-    app.config['SUPABASE_SERVICE_ROLE_KEY']
-)
-SUPABASE_BUCKET = "6milan-exam-app"
-SUPABASE_STORAGE_BASE_URL = f"{app.config['SUPABASE_URL'].rstrip('/')}/storage/v1/object/public/{SUPABASE_BUCKET}/"
+def store_profile_picture(stream, user_supabase_uid, ext, mimetype, size):
+    """Stores a validated picture (and its avatar variants); returns the public URL."""
+    if not variants_available():
+        return storage.save(stream, f"{user_supabase_uid}/profile.{ext}", mimetype, size)
+
+    # Content-hashed paths never change, so they are cached for a year
+    directory = avatar_dir(user_supabase_uid, content_hash(stream))
+    for variant_size, data in make_variants(stream).items():
+        storage.save(io.BytesIO(data), f"{directory}{variant_size}.webp", 'image/webp', len(data),
+                     cache_control=IMMUTABLE_CACHE_SECONDS)
+    return storage.save(stream, f"{directory}original.{ext}", mimetype, size,
+                        cache_control=IMMUTABLE_CACHE_SECONDS)
 
 def upload_to_supabase(file, user_supabase_uid):
-    """Uploads a profile picture and returns public URL or None."""
+    """Streams a profile picture (and its avatar variants) to storage; returns public URL or None."""
     if not file or not file.filename.strip():
         return None
 
-    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    if '.' not in file.filename:
+    try:
+        # The type comes from the file's first bytes, not its name
+        ext, mimetype, size = uploader.inspect(file.stream)
+        return store_profile_picture(file.stream, user_supabase_uid, ext, mimetype, size)
+    except (UploadRejected, UploadBusy) as e:
+        print(f"Upload rejected: {e}")
         return None
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    if ext not in allowed_extensions:
+    except Exception as e:
+        print(f"Supabase upload error: {e}")
         return None
 
-    path = f"{user_supabase_uid}/profile.{ext}"
+def queue_profile_upload(file, user_id):
+    """Validates a profile picture and hands it to the upload worker; returns the job or None."""
+    if not file or not file.filename.strip():
+        return None
     try:
-        file.stream.seek(0)
-        file_bytes = file.stream.read()
-        if not file_bytes:
-            return None
-
-        supabase.storage.from_(SUPABASE_BUCKET).upload(
-            path=path,
-            file=file_bytes,
-            file_options={"content-type": file.mimetype or f"image/{ext}", "upsert": True}
-        )
-        return f"{SUPABASE_STORAGE_BASE_URL}{path}"
-    except Exception as e:
-        print(f"Supabase upload error: {e}")
+        ext, mimetype, size = uploader.inspect(file.stream)
+        return upload_worker.enqueue(user_id, ext, mimetype, file.stream)
+    except (UploadRejected, UploadBusy) as e:
+        print(f"Upload rejected: {e}")
         return None
 
 def handle_profile_upload():
-    """Helper for profile picture upload and DB update."""
+    """Helper for profile picture upload and DB update.
+
+    Returns ``(upload_message, response)``; the view returns ``response`` when it is set.
+    """
     upload_message = None
     if 'upload_pic' in request.files:
         file = request.files['upload_pic']
+        if current_app.config['UPLOAD_ASYNC']:
+            # Stored by the background worker; the page shows a pending state until then
+            if queue_profile_upload(file, current_user.id):
+                flash("Upload received!", "success")
+            else:
+                flash("Upload failed. Please select a valid image file (JPG, PNG, GIF, WebP).", "danger")
+            # Post/redirect/get, so reloading the page never sends the picture again
+            return None, redirect(request.path)
         new_url = upload_to_supabase(file, current_user.supabase_uid)
         if new_url:
-            current_user.profile_pic = new_url
+            user = current_user.model  # current_user is a cached snapshot
+            user.profile_pic = new_url
+            bump_leaderboard_generation()
             db.session.commit()
+            invalidate_user(user.id)
             upload_message = "Profile picture updated successfully!"
         else:
             upload_message = "Upload failed. Please select a valid image file (JPG, PNG, GIF, WebP)."
-    return upload_message
+    return upload_message, None
+
+def profile_upload_state():
+    """Status of the current user's latest picture upload while it is worth showing."""
+    if not current_user.is_authenticated:
+        return None
+    row = db.session.execute(
+        db.select(UploadJob.status, UploadJob.updated_at)
+        .where(UploadJob.user_id == current_user.id)
+        .order_by(UploadJob.id.desc()).limit(1)
+    ).first()
+    if row is None or row.status == 'done':
+        return None
+    if row.status == 'failed':
+        updated = row.updated_at if row.updated_at.tzinfo else row.updated_at.replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - updated > timedelta(hours=1):
+            return None
+    return row.status
 
 def get_resized_profile_url(profile_pic_url, width=None, height=None, quality=80):
     if not profile_pic_url:
         return None
-    params = [f"width={width}" if width else "",
-              f"height={height}" if height else "",
-              f"quality={quality}",
-              "resize=cover"]
-    transform_str = "&".join(p for p in params if p)
-    return f"{profile_pic_url}?{transform_str}"
-
-@app.context_processor
+    # Pictures uploaded with variants link to the nearest precomputed WebP
+    variant = variant_url(profile_pic_url, width, height)
+    if variant:
+        return variant
+    # Older uploads: ask the storage service to transform on the fly
+    return storage.transform_url(profile_pic_url, width, height, quality)
+
 def utility_processor():
-    return dict(get_resized_profile_url=get_resized_profile_url)
+    return dict(get_resized_profile_url=get_resized_profile_url, profile_upload_state=profile_upload_state)
 
 # ---------------------- Flask setup ---------------------- #
-db.init_app(app)
-login_manager = LoginManager(app)
+login_manager = LoginManager()
 login_manager.login_view = 'login'
+SUPABASE_BUCKET = "6milan-exam-app"
+
+def _extension(name):
+    return LocalProxy(lambda: current_app.extensions[name])
+
+# Per-app objects, built by create_app; these names resolve to the current app's
+supabase = _extension('supabase')              # Supabase client (or the local stand-in), created on first use
+supabase_calls = _extension('supabase_calls')  # retries, circuit breaker and per-operation metrics
+uploader = _extension('uploader')
+storage = _extension('storage')                # Supabase bucket or MEDIA_ROOT
+token_auth = _extension('supabase_token_auth')
+query_stats = _extension('query_stats')
+metrics = _extension('metrics')
+profiler = _extension('profiler')
+upload_worker = _extension('upload_worker')
+
+ROUTES = []                    # (rule, view, options), added to every app by register_routes
+commands = AppGroup('app')     # CLI commands, likewise
+
+def route(rule, **options):
+    """Like ``app.route``, for the app(s) ``create_app`` builds."""
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
+
+def create_app(config_object=Config):
+    """Application factory. Nothing here touches the network: the Supabase client is
+    built on first use, the database is first connected to by the first query, and
+    tables are created by `flask init-db` (or DB_CREATE_ALL for local SQLite).
+
+    Each app gets its own Supabase client, caller, uploader, storage, user cache and
+    extensions (in ``app.extensions``), so apps with different configs don't share state."""
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    db.init_app(app)
+    login_manager.init_app(app)
+    calls = app.extensions['supabase_calls'] = build_caller(app.config)
+    client = app.extensions['supabase'] = LazyClient(lambda: create_supabase_client(app.config))
+    app.extensions['uploader'] = StreamingUploader.from_config(client, SUPABASE_BUCKET, app.config)
+    app.extensions['storage'] = create_storage(app.config, app.extensions['uploader'], calls)
+    verifier = refresher = None
+    if app.config['SUPABASE_BACKEND'] == 'local':
+        # The stand-in signs its own tokens (see supabase_backends.py)
+        verifier = TokenVerifier(secret=local_jwt_secret(app.config))
+        refresher = TokenRefresher(lambda token: client.auth.refresh_pair(token), calls)
+    SupabaseTokenAuth(app, verifier, refresher, caller=calls)
+    QueryStats(app)
+    app_metrics = Metrics(app)
+    for collector in (db_metrics, supabase_metrics, cache_metrics):
+        app_metrics.add_collector(collector)
+    RequestProfiler(app)
+    UploadWorker(app, process=store_profile_picture,
+                 on_change=lambda user_id: bump_leaderboard_generation(), on_done=invalidate_user)
+    app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    app.context_processor(utility_processor)
+    register_routes(app)
+    if app.config['DB_CREATE_ALL']:
+        with app.app_context():
+            db.create_all()
+    return app
+
+def register_routes(app):
+    """Add the views and CLI commands below to ``app`` (the media route only for filesystem storage)."""
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    backend = app.extensions['storage']
+    if isinstance(backend, FilesystemStorage):
+        app.add_url_rule(f"{backend.url_path}<path:path>", 'media', media)
+    for command in commands.commands.values():
+        app.cli.add_command(command)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    db.create_all()
+    return user_cache.get(int(user_id))
 
 # ---------------------- Routes ---------------------- #
 
-@app.route('/')
+@route('/')
 def index():
     return redirect(url_for('login'))
 
-@app.route('/signup', methods=['GET', 'POST'])
+@route('/signup', methods=['GET', 'POST'])
 def signup():
     if current_user.is_authenticated:
         return redirect(url_for('profile' if current_user.role == 'student' else 'admin_dashboard'))
@@ -133,11 +265,12 @@ def signup():
         password = form.password.data
 
         try:
-            response = supabase.auth.sign_up({
+            # Not retried: a lost response could otherwise create the account twice
+            response = supabase_calls.call('auth.sign_up', supabase.auth.sign_up, {
                 "email": email,
                 "password": password,
                 "options": {"data": {"username": username}}
-            })
+            }, retry=False)
             if response.user:
                 supabase_uid = response.user.id
                 if User.query.filter_by(supabase_uid=supabase_uid).first():
@@ -156,13 +289,15 @@ def signup():
                 db.session.commit()
                 flash('Signup successful! Your account is pending admin approval.', 'success')
                 return redirect(url_for('login'))
+        except SupabaseUnavailable:
+            flash('Sign-up is temporarily unavailable. Please try again in a minute.', 'warning')
         except Exception as e:
             print("Signup error:", e)
             flash('Signup failed. Please try again.', 'danger')
 
     return render_template('signup.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('profile' if current_user.role == 'student' else 'admin_dashboard'))
@@ -173,7 +308,8 @@ def login():
         password = form.password.data
 
         try:
-            response = supabase.auth.sign_in_with_password({"email": email, "password": password})
+            response = supabase_calls.call('auth.sign_in_with_password', supabase.auth.sign_in_with_password,
+                                           {"email": email, "password": password})
             if not response.user:
                 flash('Invalid email or password.', 'danger')
                 return render_template('login.html', form=form)
@@ -195,7 +331,7 @@ def login():
                 flash('Account created! Please wait for admin approval.', 'info')
 
             if user.role == 'student' and not user.approved:
-                supabase.auth.sign_out()
+                supabase_calls.call('auth.sign_out', supabase.auth.sign_out)
                 flash('Your account is pending admin approval.', 'warning')
                 return render_template('login.html', form=form)
 
@@ -205,13 +341,15 @@ def login():
             flash('Login successful!', 'success')
             next_page = request.args.get('next')
             return redirect(next_page or url_for('profile' if user.role == 'student' else 'admin_dashboard'))
+        except SupabaseUnavailable:
+            flash('Login is temporarily unavailable. Please try again in a minute.', 'warning')
         except Exception as e:
             print("Login error:", e)
             flash('Invalid email or password.', 'danger')
 
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -219,55 +357,30 @@ def logout():
     return redirect(url_for('login'))
 
 # ---------------------- Student Profile ---------------------- #
-@app.route('/profile', methods=['GET', 'POST'])
-@login_required
+@route('/profile', methods=['GET', 'POST'])
+@supabase_login_required
 def profile():
     if current_user.role != 'student':
         return redirect(url_for('admin_dashboard' if current_user.role == 'admin' else 'login'))
 
-    upload_message = handle_profile_upload()
+    upload_message, response = handle_profile_upload()
+    if response is not None:
+        return response
     form = SelectCategoryForm()
     if form.validate_on_submit():
         return redirect(url_for('exam', category=form.category.data, section='section1'))  # Default to section1
 
-    scores = Score.query.filter_by(user_id=current_user.id).order_by(Score.date).all()
-    total_exams = len(scores)
-    total_score = get_total_score(current_user.id)
+    stats = get_user_stats(current_user.id)
+    total_exams = stats.total_exams if stats else 0
+    total_score = stats.total_score if stats else 0
     remark = get_performance_remark(total_score, total_exams)
 
-    chart_data = {
-        'labels': [s.date.strftime('%b %d, %Y') for s in scores],
-        'scores': [s.score for s in scores]
-    }
-
-    category_scores = {}
-    category_counts = {}
-    for s in scores:
-        cat = s.category
-        category_scores[cat] = category_scores.get(cat, 0) + s.score
-        category_counts[cat] = category_counts.get(cat, 0) + 1
-
-    avg_category_data = {cat: round(category_scores[cat] / category_counts[cat], 1)
-                         for cat in category_scores if category_counts[cat] > 0}
-
-    # NEW: Section information for displaying available exams
-    section_info = {}
-    from questions import questions  # Ensure access to questions
-    for category in questions.keys():
-        if isinstance(questions[category], dict):  # New format with sections
-            section_info[category] = {
-                'section1_count': len(questions[category].get('section1', [])),
-                'section2_count': len(questions[category].get('section2', [])),
-                'section1_author': questions[category].get('section1_author', 'Unknown'),
-                'section2_author': questions[category].get('section2_author', 'Unknown')
-            }
-        else:  # Old format (backward compatibility)
-            section_info[category] = {
-                'section1_count': len(questions[category]),
-                'section2_count': 0,
-                'section1_author': 'Legacy',
-                'section2_author': None
-            }
+    # Compact payload: epoch-ms timestamps in 't', bucket averages in 'y'
+    chart_data = (user_trend(current_user.id, max_points=current_app.config['CHART_MAX_POINTS'])
+                  if total_exams else {'t': [], 'y': []})
+
+    category_stats = UserCategoryStats.query.filter_by(user_id=current_user.id).all() if total_exams else []
+    avg_category_data = {cs.category: cs.average_score for cs in category_stats if cs.exam_count > 0}
 
     return render_template(
         'profile.html',
@@ -278,48 +391,71 @@ def profile():
         total_exams=total_exams,
         remark=remark,
         avg_category_data=avg_category_data,
-        section_info=section_info  # NEW: Pass section info to template
+        section_info=question_bank.section_info  # Precomputed once at import
     )
 
 
+def media(path):
+    """Pictures stored by the filesystem backend (conditional, sendfile-capable responses)."""
+    return storage.send(path)
+
+@route('/profile/api/upload_status')
+@supabase_login_required
+def profile_api_upload_status():
+    """Polled by the pending-upload notice; ``null`` once the new picture is live."""
+    return jsonify(status=profile_upload_state())
+
+@route('/profile/api/trend')
+@supabase_login_required
+def profile_api_trend():
+    """The signed-in student's score trend; ?days=N picks daily or weekly buckets."""
+    return jsonify(user_trend(current_user.id, days=_trend_days(), **_chart_options()))
+
 # ---------------------- Student Profile Update ---------------------- #
-@app.route('/student_profile', methods=['GET', 'POST'])
-@login_required
+@route('/student_profile', methods=['GET', 'POST'])
+@supabase_login_required
 def student_profile():
     if current_user.role != 'student':
         flash('Access denied.', 'danger')
         return redirect(url_for('login'))
 
-    upload_message = handle_profile_upload()
+    upload_message, response = handle_profile_upload()
+    if response is not None:
+        return response
 
     if request.method == "POST" and 'update_profile' in request.form:
         new_username = request.form.get("username", "").strip()
         new_email = request.form.get("email", "").strip().lower()
+        user = current_user.model
         if new_username:
-            current_user.username = new_username
+            user.username = new_username
         if new_email:
-            current_user.email = new_email
+            user.email = new_email
+        bump_leaderboard_generation()
         db.session.commit()
+        invalidate_user(user.id)
         flash("Profile updated successfully!", "success")
         return redirect(url_for("student_profile"))
 
     return render_template("student_profile.html", upload_message=upload_message)
 
 # ---------------------- Admin Profile ---------------------- #
-@app.route('/admin_profile', methods=['GET', 'POST'])
-@login_required
+@route('/admin_profile', methods=['GET', 'POST'])
+@supabase_login_required
 def admin_profile():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
         return redirect(url_for('login'))
-    upload_message = handle_profile_upload()
+    upload_message, response = handle_profile_upload()
+    if response is not None:
+        return response
     return render_template('admin_profile.html', upload_message=upload_message)
 
 # ---------------------- Exam Route ---------------------- #
-@app.route('/exam/<category>/<section>', methods=['GET', 'POST'])  # CHANGED: Added <section>
-@login_required
+@route('/exam/<category>/<section>', methods=['GET', 'POST'])  # CHANGED: Added <section>
+@supabase_login_required
 def exam(category, section='section1'):  # NEW: Default to section1
-    if current_user.role != 'student' or category not in questions:
+    if current_user.role != 'student' or category not in question_bank:
         flash('Invalid category or access denied.', 'danger')
         return redirect(url_for('profile'))
 
@@ -328,37 +464,46 @@ def exam(category, section='section1'):  # NEW: Default to section1
         flash('Invalid section selected.', 'danger')
         return redirect(url_for('profile'))
 
-    # NEW: Get questions for specific section (using helper function)
-    from questions import get_section_questions, get_section_author
-    q_list = get_section_questions(category, section)
+    # Frozen, pre-indexed questions for this section
+    q_list = question_bank.section(category, section)
     
     if not q_list:
         flash(f'No questions available for {category} - {section}', 'warning')
         return redirect(url_for('profile'))
 
-    # Dynamic form generation for this specific section
-    fields = {f'q{i+1}': RadioField(q, choices=opts, validators=[DataRequired()]) 
-              for i, (q, opts, _) in enumerate(q_list)}
-    ExamForm = type(f'{category}_{section}_ExamForm', (FlaskForm,), {**fields, 'submit': SubmitField('Submit Exam')})
-    form = ExamForm()
+    # Fast path: a complete submission is parsed once and graded against the
+    # section's answer key without binding and validating every form field.
+    if request.method == 'POST' and csrf_token_valid():
+        answer_key = grading_engine.key_for(category, section)
+        answers = answer_key.parse(request.form)
+        if answer_key.is_complete(answers):
+            score = answer_key.grade(answers).score
+            full_category = f"{category}_{section}"  # NEW: Track section in category name
+            record_score(current_user.id, full_category, score, datetime.now(timezone.utc))
+            db.session.commit()
+            metrics.exam_submitted()
+            flash(f'You scored {score}/{len(q_list)} in {category} {section}!', 'success')
+            return redirect(url_for('profile'))
 
-    if form.validate_on_submit():
-        score = sum(getattr(form, f'q{i+1}').data == ans for i, (_, _, ans) in enumerate(q_list))
-        full_category = f"{category}_{section}"  # NEW: Track section in category name
-        db.session.add(Score(user_id=current_user.id, category=full_category, score=score,
-                             date=datetime.now(timezone.utc)))
-        db.session.commit()
-        flash(f'You scored {score}/{len(q_list)} in {category} {section}!', 'success')
-        return redirect(url_for('profile'))
+    # Question markup is rendered once per section; only answers/errors are spliced in
+    fragment = get_exam_fragment(category, section, question_bank)
+    if request.method == 'POST':
+        # Incomplete or invalid submission: validate the bound form for field errors
+        form = get_exam_form_class(category, section, question_bank)()
+        form.validate_on_submit()
+        exam_body = fragment.render(request.form, form.errors)
+    else:
+        exam_body = fragment.render()
 
     # NEW: Get section author info
-    section_author = get_section_author(category, section) or "Unknown Author"
+    section_author = question_bank.author(category, section) or "Unknown Author"
     
     # Backward compatibility for old question format
     display_title = f"{category.replace('_', ' ').title()} - {section.replace('section', 'Section ')}"
     
     return render_template('exam.html', 
-                         form=form, 
+                         exam_body=exam_body,
+                         csrf_token=generate_csrf() if current_app.config.get('WTF_CSRF_ENABLED', True) else None,
                          category=category,
                          section=section,  # NEW
                          display_title=display_title,  # NEW
@@ -368,8 +513,8 @@ def exam(category, section='section1'):  # NEW: Default to section1
 
 
 # ---------------------- Admin Dashboard ---------------------- #
-@app.route('/admin', methods=['GET', 'POST'])
-@login_required
+@route('/admin', methods=['GET', 'POST'])
+@supabase_login_required
 def admin_dashboard():
     if current_user.role != 'admin':
         flash('Access denied: Admin privileges required.', 'danger')
@@ -385,98 +530,295 @@ def admin_dashboard():
                 if user and user.role == 'student':
                     if action == 'approve':
                         user.approved = True
+                        bump_leaderboard_generation()
                         db.session.commit()
+                        invalidate_user(user_id)
                         flash(f'{user.username} has been approved.', 'success')
                     elif action == 'reject':
                         Score.query.filter_by(user_id=user.id).delete()
                         db.session.delete(user)
+                        bump_leaderboard_generation()
                         db.session.commit()
+                        invalidate_user(user_id)
                         flash(f'{user.username} has been rejected and removed.', 'info')
             except Exception as e:
                 print("Admin action error:", e)
                 flash('Invalid action.', 'danger')
 
-    pending_users = User.query.filter_by(approved=False, role='student').order_by(User.username).all()
-    approved_users = User.query.filter_by(approved=True, role='student').order_by(User.username).all()
-
-    approved_user_ids = [u.id for u in approved_users]
-    all_scores = Score.query.filter(Score.user_id.in_(approved_user_ids)).order_by(Score.date).all() if approved_user_ids else []
-
-    user_scores = {}
-    for score in all_scores:
-        user_scores.setdefault(score.user_id, []).append(score)
-
-    category_scores, category_counts = {}, {}
-    for score in all_scores:
-        cat = score.category
-        category_scores[cat] = category_scores.get(cat, 0) + score.score
-        category_counts[cat] = category_counts.get(cat, 0) + 1
-
-    avg_category_data = {cat: round(category_scores[cat]/category_counts[cat], 1)
-                         for cat in category_scores if category_counts[cat] > 0}
-
-    trend_data = {'labels': [s.date.strftime('%b %d') for s in all_scores],
-                  'data': [s.score for s in all_scores]} if all_scores else {'labels': [], 'data': []}
-
-    return render_template('admin_dashboard.html',
-                           pending_users=pending_users,
-                           approved_users=approved_users,
-                           user_scores=user_scores,
-                           avg_category_data=avg_category_data,
-                           trend_data=trend_data)
+    # Lists, totals and charts are fetched on demand from the /admin/api/* endpoints
+    return render_template('admin_dashboard.html')
+
+# ---------------------- Admin JSON API ---------------------- #
+ADMIN_PAGE_SIZE = 20
+ADMIN_MAX_PAGE_SIZE = 100
+
+def admin_api(view):
+    """Like supabase_login_required + the admin role check, but answers with JSON errors."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.role != 'admin':
+            return jsonify(error='Admin privileges required.'), 403
+        if current_app.config['SUPABASE_VERIFY_TOKENS'] and not token_auth.check_session():
+            logout_user()
+            return jsonify(error='Your session has expired. Please log in again.'), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+def _search_filter(query, term):
+    term = (term or '').strip()
+    if not term:
+        return query
+    pattern = f"%{term}%"
+    return query.where(User.username.ilike(pattern) | User.email.ilike(pattern))
+
+def _paginate(query):
+    """Run one page of a select (rows, not scalars) plus a COUNT; returns (rows, meta)."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', ADMIN_PAGE_SIZE, type=int), 1), ADMIN_MAX_PAGE_SIZE)
+    total = db.session.execute(db.select(func.count()).select_from(query.order_by(None).subquery())).scalar()
+    rows = db.session.execute(query.limit(per_page).offset((page - 1) * per_page)).all()
+    pages = (total + per_page - 1) // per_page
+    return rows, {'page': page, 'pages': pages, 'total': total, 'per_page': per_page}
+
+@route('/admin/api/pending')
+@admin_api
+def admin_api_pending():
+    query = db.select(User.id, User.username, User.email).where(User.approved == False, User.role == 'student')
+    query = _search_filter(query, request.args.get('q')).order_by(User.username)
+    rows, meta = _paginate(query)
+    return jsonify(items=[{'id': u.id, 'username': u.username, 'email': u.email} for u in rows], **meta)
+
+ADMIN_STUDENT_SORTS = {
+    'username': (User.username.asc(),),
+    'score_desc': (func.coalesce(UserStats.total_score, 0).desc(), User.username.asc()),
+    'exams_desc': (func.coalesce(UserStats.total_exams, 0).desc(), User.username.asc()),
+    'average_desc': (func.coalesce(AVERAGE, 0).desc(), User.username.asc()),
+}
+
+@route('/admin/api/students')
+@admin_api
+def admin_api_students():
+    sort = request.args.get('sort', 'username')
+    query = (db.select(User.id, User.username, User.email, User.profile_pic,
+                       func.coalesce(UserStats.total_score, 0).label('total_score'),
+                       func.coalesce(UserStats.total_exams, 0).label('total_exams'),
+                       func.coalesce(AVERAGE, 0).label('average'))
+             .outerjoin(UserStats, UserStats.user_id == User.id)
+             .where(User.approved == True, User.role == 'student'))
+    query = _search_filter(query, request.args.get('q'))
+    query = query.order_by(*ADMIN_STUDENT_SORTS.get(sort, ADMIN_STUDENT_SORTS['username']))
+    rows, meta = _paginate(query)
+    items = [{'id': row.id, 'username': row.username, 'email': row.email,
+              'profile_pic': get_resized_profile_url(row.profile_pic, width=120, height=120),
+              'total_score': row.total_score, 'total_exams': row.total_exams,
+              'average': float(row.average)} for row in rows]
+    return jsonify(items=items, **meta)
+
+@route('/admin/api/category_averages')
+@admin_api
+def admin_api_category_averages():
+    rows = db.session.execute(
+        db.select(UserCategoryStats.category,
+                  func.sum(UserCategoryStats.score_sum), func.sum(UserCategoryStats.exam_count))
+        .join(User, User.id == UserCategoryStats.user_id)
+        .where(User.approved == True, User.role == 'student')
+        .group_by(UserCategoryStats.category)
+        .order_by(UserCategoryStats.category)
+    ).all()
+    data = {cat: round(total / count, 1) for cat, total, count in rows if count}
+    return jsonify(labels=list(data.keys()), data=list(data.values()))
+
+@route('/admin/api/trend')
+@admin_api
+def admin_api_trend():
+    """Academy score trend from the rollup tables; ?days=N picks daily or weekly buckets."""
+    return jsonify(academy_trend(days=_trend_days(), category=request.args.get('category') or None,
+                                 **_chart_options()))
+
+@route('/admin/api/profiles')
+@admin_api
+def admin_api_profiles():
+    """Recently sampled request profiles (see profiler.py)."""
+    return jsonify(items=[p.summary() for p in profiler.recent()])
+
+@route('/admin/api/profiles/<int:profile_id>.folded')
+@admin_api
+def admin_api_profile_download(profile_id):
+    """One profile as collapsed stacks for flamegraph.pl / speedscope."""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify(error='Profile not found (the buffer keeps only the most recent ones).'), 404
+    response = make_response(profile.collapsed())
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}-{profile.endpoint}.folded'
+    return response
+
+def _trend_days():
+    days = request.args.get('days', type=int)
+    return days if days and days > 0 else None
+
+def _chart_options():
+    """Downsampling options from ?points= and ?method= (capped at CHART_MAX_POINTS)."""
+    limit = current_app.config['CHART_MAX_POINTS']
+    points = request.args.get('points', limit, type=int)
+    method = request.args.get('method', 'lttb')
+    return {'max_points': min(max(points, 3), limit),
+            'method': method if method in DOWNSAMPLERS else 'lttb'}
 
 # ---------------------- Leaderboard ---------------------- #
-@app.route('/leaderboard')
+@route('/leaderboard')
 def leaderboard():
-    sort = request.args.get('sort', 'average_desc')
-    students_with_scores = (
-        db.session.query(User.id, User.username, User.email, User.profile_pic)
-        .outerjoin(Score, User.id == Score.user_id)
-        .filter(User.role == 'student', User.approved == True)
-        .group_by(User.id)
-        .having(func.count(Score.id) > 0)
-        .all()
-    )
-
+    sort = request.args.get('sort', DEFAULT_SORT)
+    after = parse_cursor(request.args.get('after'))
+    version, last_modified = leaderboard_version()
+
+    # Anonymous pages are identical for everyone and can live on the edge; signed-in
+    # pages carry the user's header and rank, so they are only revalidated privately.
+    is_student = current_user.is_authenticated and current_user.role == 'student'
+    viewer = current_user.id if current_user.is_authenticated else None
     current_date = datetime.now().strftime("%B %d, %Y")
-    if not students_with_scores:
-        return render_template('leaderboard.html', top_performers=[], total_students=0,
-                               all_avg=0, current_date=current_date, current_sort=sort)
-
-    student_ids = [s.id for s in students_with_scores]
-    all_scores = Score.query.filter(Score.user_id.in_(student_ids)).order_by(Score.user_id, Score.date).all()
-
-    leaderboard_data, student_scores = [], {sid: [] for sid in student_ids}
-    for score in all_scores:
-        student_scores[score.user_id].append(score)
-
-    for student in students_with_scores:
-        scores = student_scores[student.id]
-        total_exams = len(scores)
-        total_score = sum(s.score for s in scores)
-        average = round(total_score / total_exams, 1) if total_exams else 0
-        leaderboard_data.append({'id': student.id, 'username': student.username, 'email': student.email,
-                                 'profile_pic': student.profile_pic, 'total_exams': total_exams,
-                                 'total_score': total_score, 'average': average})
-
-    sort_keys = {
-        'average_desc': lambda x: (-x['average'], -x['total_exams']),
-        'average_asc': lambda x: (x['average'], -x['total_exams']),
-        'exams_desc': lambda x: (-x['total_exams'], -x['average']),
-        'score_desc': lambda x: (-x['total_score'], -x['average'])
-    }
-    leaderboard_data.sort(key=sort_keys.get(sort, sort_keys['average_desc']))
-    for i, item in enumerate(leaderboard_data, 1):
-        item['rank'] = i
-
-    top_performers = leaderboard_data[:10]
-    total_students = len(leaderboard_data)
-    all_avg = round(sum(x['average'] for x in leaderboard_data) / total_students, 1) if total_students else 0
-
-    return render_template('leaderboard.html', top_performers=top_performers,
-                           total_students=total_students, all_avg=all_avg,
-                           current_user=current_user, current_date=current_date,
-                           current_sort=sort)
+    etag = leaderboard_etag(version, sort, after, viewer, current_date)
+    cacheable = '_flashes' not in session
+    if cacheable and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return _leaderboard_cache_headers(current_app.response_class(status=304), etag, last_modified, viewer)
+
+    page = cached_leaderboard_page(sort, after, version)
+
+    # "Where am I": the current student's own rank, without loading the table
+    my_rank = leaderboard_rank(current_user.id, sort) if is_student else None
+
+    response = make_response(render_template(
+        'leaderboard.html', top_performers=page['rows'],
+        total_students=page['total_students'], all_avg=page['all_avg'],
+        next_after=page['next_after'], is_first_page=after is None,
+        my_rank=my_rank,
+        current_user=current_user, current_date=current_date,
+        current_sort=sort))
+    if cacheable:
+        _leaderboard_cache_headers(response, etag, last_modified, viewer)
+    return response
+
+def _leaderboard_cache_headers(response, etag, last_modified, viewer):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    if viewer is None:
+        response.headers['Cache-Control'] = (
+            f"public, max-age=0, s-maxage={current_app.config['LEADERBOARD_S_MAXAGE']}, "
+            f"stale-while-revalidate={current_app.config['LEADERBOARD_STALE_WHILE_REVALIDATE']}")
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+# ---------------------- Metrics ---------------------- #
+def db_metrics():
+    return pool_lines(db.engine) + [
+        '# HELP db_queries_total SQL statements run while serving requests.',
+        '# TYPE db_queries_total counter',
+        f'db_queries_total {query_stats.queries}',
+        '# HELP db_query_seconds_total Time spent in SQL while serving requests.',
+        '# TYPE db_query_seconds_total counter',
+        f'db_query_seconds_total {query_stats.seconds:.6f}']
+
+def supabase_metrics():
+    return operation_lines(supabase_calls.metrics.snapshot(), supabase_calls.metrics.buckets) + [
+        '# HELP supabase_circuit_open 1 while the Supabase circuit breaker is open.',
+        '# TYPE supabase_circuit_open gauge',
+        f'supabase_circuit_open {int(supabase_calls.breaker.state == "open")}']
+
+def cache_metrics():
+    return cache_lines({'user': (user_cache.hits, user_cache.misses),
+                        'leaderboard': (rankings.cache_stats['hits'], rankings.cache_stats['misses'])})
+
+@route('/metrics')
+def metrics_endpoint():
+    """Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; otherwise admins only."""
+    token = current_app.config.get('METRICS_TOKEN')
+    scraper = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and not (current_user.is_authenticated and current_user.role == 'admin'):
+        return 'Forbidden\n', 403, {'Content-Type': 'text/plain'}
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE, 'Cache-Control': 'no-store'}
+
+# ---------------------- Scheduled jobs ---------------------- #
+def cron_job(view):
+    """For schedulers that can only make HTTP calls; needs "Authorization: Bearer <CRON_SECRET>"."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        secret = current_app.config.get('CRON_SECRET')
+        if not secret:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {secret}'):
+            return jsonify(error='Forbidden'), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+@route('/cron/refresh-rollups')
+@cron_job
+def cron_refresh_rollups():
+    """Same as `flask refresh-rollups`."""
+    return jsonify(folded=refresh_score_rollups())
+
+@route('/cron/process-uploads')
+@cron_job
+def cron_process_uploads():
+    """Same as `flask process-uploads`."""
+    return jsonify(processed=upload_worker.drain())
+
+# ---------------------- CLI ---------------------- #
+@commands.command('backfill-user-stats')
+def backfill_user_stats_command():
+    """Rebuild the UserStats/UserCategoryStats aggregates from the scores table."""
+    rebuild_user_stats()
+    print(f"✅ Rebuilt stats for {UserStats.query.count()} users")
+
+@commands.command('backfill-rollups')
+def backfill_rollups_command():
+    """Rebuild the daily/weekly score rollup tables from the scores table."""
+    rebuild_rollups()
+    print("✅ Rebuilt score rollups")
+
+@commands.command('refresh-rollups')
+def refresh_rollups_command():
+    """Fold scores submitted since the last run into the academy-wide rollups (run from cron)."""
+    print(f"✅ Folded {refresh_score_rollups()} scores into the academy rollups")
+
+@commands.command('init-db')
+def init_db_command():
+    """Create missing tables (run once per deployment, not on every cold start)."""
+    for line in describe(current_app.config):
+        print(line)
+    db.create_all()
+    print("✅ Tables created")
+
+@commands.command('config-summary')
+def config_summary_command():
+    """Show which database and backends the app is configured for."""
+    for line in describe(current_app.config):
+        print(line)
+
+@commands.command('process-uploads')
+def process_uploads_command():
+    """Process pending profile-picture upload jobs in the foreground."""
+    print(f"✅ Processed {upload_worker.drain()} upload jobs")
+
+@commands.command('generate-data')
+@click.option('--students', default=1000, show_default=True, help='Students to create.')
+@click.option('--scores', default=20000, show_default=True, help='Score rows to create.')
+@click.option('--pending-ratio', default=0.05, show_default=True, help='Fraction left unapproved.')
+@click.option('--days', default=365, show_default=True, help='Spread attempts over this many days.')
+@click.option('--seed', type=int, default=None, help='Seed for reproducible distributions.')
+@click.option('--batch-size', default=20000, show_default=True, help='Rows per INSERT batch.')
+def generate_data_command(students, scores, pending_ratio, days, seed, batch_size):
+    """Bulk-insert synthetic students and scores for benchmarking (never run in production)."""
+    print(f"Generating {students} students and {scores} scores...")
+    generate_dataset(students, scores, pending_ratio=pending_ratio, days=days, seed=seed, batch_size=batch_size)
+    bump_leaderboard_generation()
+    db.session.commit()
+    print("✅ Synthetic data generated")
+
+# ---------------------- App ---------------------- #
+app = create_app()  # for `flask run`, gunicorn and Vercel
 
 # ---------------------- Run ---------------------- #
 if __name__ == '__main__':
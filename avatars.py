@@ -0,0 +1,86 @@
+# avatars.py
+"""Precomputed avatar variants.
+
+At upload time the picture is decoded once and square WebP thumbnails are
+written next to the original under a content-hash directory:
+
+    <uid>/avatars/<sha256[:16]>/original.<ext>
+    <uid>/avatars/<sha256[:16]>/48.webp, 120.webp, 256.webp
+
+A new picture gets a new hash, so every URL is immutable and can be cached
+forever. List pages link straight to the nearest variant instead of asking
+the storage service to transform the original on every view. Pillow is
+optional: without it uploads keep the old single-file layout and URLs
+fall back to on-the-fly transforms.
+"""
+import hashlib
+import io
+import re
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # variants are skipped, see module docstring
+    Image = None
+
+AVATAR_SIZES = (48, 120, 256)
+VARIANT_QUALITY = 80
+MAX_PIXELS = 40_000_000          # image size from the header; refuse decompression bombs early
+MAX_DECODE_PIXELS = 4096 * 4096  # pixels actually decoded: at most 64 MB as RGBA
+IMMUTABLE_CACHE_SECONDS = 31536000
+HASH_LENGTH = 16
+
+_HASHED_ORIGINAL = re.compile(r'^(?P<base>.+/avatars/[0-9a-f]{%d}/)original\.[a-z]+$' % HASH_LENGTH)
+
+
+def variants_available():
+    return Image is not None
+
+
+def content_hash(stream, read_size=64 * 1024):
+    """Hex SHA-256 of a seekable stream, read in pieces; the stream is rewound."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for piece in iter(lambda: stream.read(read_size), b''):
+        digest.update(piece)
+    stream.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def avatar_dir(user_supabase_uid, digest):
+    return f"{user_supabase_uid}/avatars/{digest}/"
+
+
+def make_variants(stream, sizes=AVATAR_SIZES, quality=VARIANT_QUALITY):
+    """``{size: webp bytes}`` of square, centre-cropped thumbnails; the stream is rewound."""
+    stream.seek(0)
+    with Image.open(stream) as image:
+        if image.width * image.height > MAX_PIXELS:
+            raise ValueError('Image dimensions too large')
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is all a 256px thumbnail needs;
+        # PNG, GIF and WebP have no reduced decode, so their full size counts against the budget
+        image.draft('RGB', (max(sizes) * 2, max(sizes) * 2))
+        if image.width * image.height > MAX_DECODE_PIXELS:
+            raise ValueError('Image dimensions too large')
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        variants = {}
+        for size in sorted(sizes, reverse=True):
+            buffer = io.BytesIO()
+            ImageOps.fit(image, (size, size), Image.LANCZOS).save(buffer, 'WEBP', quality=quality, method=4)
+            variants[size] = buffer.getvalue()
+    stream.seek(0)
+    return variants
+
+
+def nearest_variant(width=None, height=None, sizes=AVATAR_SIZES):
+    """Smallest variant covering the requested box (the largest if none does)."""
+    wanted = max(width or 0, height or 0)
+    return next((size for size in sorted(sizes) if size >= wanted), max(sizes))
+
+
+def variant_url(profile_pic_url, width=None, height=None):
+    """URL of the precomputed variant for a hashed original, or None for legacy uploads."""
+    match = _HASHED_ORIGINAL.match(profile_pic_url)
+    if match is None:
+        return None
+    return f"{match.group('base')}{nearest_variant(width, height)}.webp"
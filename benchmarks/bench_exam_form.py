@@ -0,0 +1,65 @@
+# benchmarks/bench_exam_form.py
+"""Per-request cost of building the exam form, uncached vs. cached.
+
+Run from the repository root:
+
+    python benchmarks/bench_exam_form.py --questions 100 --requests 500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from forms import build_exam_form_class, get_exam_form_class, clear_exam_form_cache
+from questions import QuestionBank
+
+
+def synthetic_bank(num_questions):
+    options = [("A", "Option A"), ("B", "Option B"), ("C", "Option C"), ("D", "Option D")]
+    section = [(f"Question {i + 1}: synthetic?", options, "ABCD"[i % 4]) for i in range(num_questions)]
+    return QuestionBank({'Bench': {'section1': section, 'section2': [],
+                                   'section1_author': None, 'section2_author': None}})
+
+
+def time_per_request(fn, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='bench', WTF_CSRF_ENABLED=False)
+    bank = synthetic_bank(args.questions)
+    q_list = bank.section('Bench', 'section1')
+
+    def uncached():
+        build_exam_form_class('Bench', 'section1', q_list)()
+
+    def cached():
+        get_exam_form_class('Bench', 'section1', bank)()
+
+    with app.test_request_context('/exam/Bench/section1'):
+        clear_exam_form_cache()
+        cached()  # warm the cache once, as the first request would
+        before = time_per_request(uncached, args.requests)
+        after = time_per_request(cached, args.requests)
+
+    print(f"questions={args.questions} requests={args.requests}")
+    print(f"uncached: {before * 1e3:8.3f} ms/request")
+    print(f"cached:   {after * 1e3:8.3f} ms/request")
+    print(f"speedup:  {before / after:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# benchmarks/bench_exam_stages.py
+"""Per-stage cost of exam(), profile() and leaderboard() vs. question count.
+
+For synthetic sections of 20/100/500/1000 questions this times each stage
+of serving and grading an exam: form-class creation, form instantiation,
+validate_on_submit, grading, fragment rendering and render_template of
+exam.html. profile() and leaderboard() are then timed through the test
+client against a synthetic class of students. Results are printed and can
+be written as JSON to compare commits:
+
+    python benchmarks/bench_exam_stages.py --json before.json
+    python benchmarks/bench_exam_stages.py --json after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_exam_form import synthetic_bank
+
+SIZES = (20, 100, 500, 1000)
+
+
+def measure(fn, min_time=0.2, min_runs=5):
+    """Call ``fn`` until ``min_time`` has passed; per-call times in milliseconds."""
+    fn()  # warm-up
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1e3)
+    return {'median_ms': statistics.median(times), 'min_ms': min(times),
+            'mean_ms': statistics.fmean(times), 'runs': len(times)}
+
+
+def configure():
+    """Import the app against the local Supabase stand-in and a scratch SQLite database."""
+    os.environ['SUPABASE_BACKEND'] = 'local'
+    os.environ['SUPABASE_LOCAL_LATENCY'] = '0'
+    os.environ['SUPABASE_LOCAL_JITTER'] = '0'
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-exam-'), 'bench.db')}"
+    import app as exam_app
+    exam_app.app.config['WTF_CSRF_ENABLED'] = False  # time the stages, not token checks
+    return exam_app
+
+
+def bench_exam_stages(exam_app, size, min_time):
+    from flask import render_template
+    from exam_fragments import get_exam_fragment, clear_exam_fragment_cache
+    from forms import build_exam_form_class, get_exam_form_class
+    from grading import GradingEngine
+
+    bank = synthetic_bank(size)
+    q_list = bank.section('Bench', 'section1')
+    answers = {f'q{i + 1}': random.choice('ABCD') for i in range(size)}
+    key = GradingEngine(bank).key_for('Bench', 'section1')
+
+    def render_page():
+        render_template('exam.html', exam_body=exam_body, csrf_token=None, category='Bench',
+                        section='section1', display_title='Bench - Section 1', section_author='Bench',
+                        num_questions=size, total_time_seconds=size * 60)
+
+    results = {}
+    with exam_app.app.test_request_context('/exam/Bench/section1', method='POST', data=answers):
+        form_class = get_exam_form_class('Bench', 'section1', bank)
+        clear_exam_fragment_cache()
+        fragment = get_exam_fragment('Bench', 'section1', bank)
+        exam_body = fragment.render(answers)
+
+        results['form_class'] = measure(lambda: build_exam_form_class('Bench', 'section1', q_list), min_time)
+        results['form_instance'] = measure(form_class, min_time)
+        form = form_class()
+        results['validate_on_submit'] = measure(form.validate_on_submit, min_time)
+        results['grade'] = measure(lambda: key.grade(key.parse(answers)), min_time)
+        results['fragment_compile'] = measure(
+            lambda: (clear_exam_fragment_cache(), get_exam_fragment('Bench', 'section1', bank)), min_time)
+        results['fragment_render'] = measure(lambda: fragment.render(answers), min_time)
+        results['render_template'] = measure(render_page, min_time)
+    return results
+
+
+def seed_class(exam_app, students, exams_per_student):
+    """Synthetic class of approved students; returns one of their ids to view pages as."""
+    from synthetic import generate_dataset
+    with exam_app.app.app_context():
+        ids = generate_dataset(students, students * exams_per_student, pending_ratio=0, days=90,
+                               seed=students, log=lambda line: None)
+        return ids[0]
+
+
+def bench_pages(exam_app, students, exams_per_student, min_time):
+    import rankings
+    viewer = seed_class(exam_app, students, exams_per_student)
+    client = exam_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(viewer)
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    def cold_leaderboard():
+        rankings._page_cache.clear()  # drop the cached page so it is recomputed
+        get('/leaderboard')
+
+    return {'profile': measure(lambda: get('/profile'), min_time),
+            'leaderboard_cold': measure(cold_leaderboard, min_time),
+            'leaderboard_warm': measure(lambda: get('/leaderboard'), min_time)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--exams-per-student', type=int, default=10)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent timing each stage')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='earlier --json output to show ratios against')
+    args = parser.parse_args()
+
+    random.seed(0)
+    exam_app = configure()
+    results = []
+    for size in args.sizes:
+        for stage, timing in bench_exam_stages(exam_app, size, args.min_time).items():
+            results.append({'name': f'exam.{stage}', 'questions': size, **timing})
+    for page, timing in bench_pages(exam_app, args.students, args.exams_per_student, args.min_time).items():
+        results.append({'name': page, 'students': args.students, **timing})
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {(r['name'], r.get('questions')): r for r in json.load(f)['results']}
+
+    print(f"{'benchmark':<26}{'questions':>10}{'median ms':>12}{'min ms':>10}{'runs':>7}"
+          + (f"{'vs base':>10}" if previous else ''))
+    for r in results:
+        line = (f"{r['name']:<26}{r.get('questions', ''):>10}{r['median_ms']:>12.3f}"
+                f"{r['min_ms']:>10.3f}{r['runs']:>7}")
+        base = previous.get((r['name'], r.get('questions')))
+        if base:
+            line += f"{r['median_ms'] / base['median_ms']:>9.2f}x"
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': git_commit(), 'python': platform.python_version(),
+                       'created': datetime.now(timezone.utc).isoformat(),
+                       'students': args.students, 'exams_per_student': args.exams_per_student,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/import_budget.py
+"""Cold-start budget: what importing app.py costs, module by module.
+
+Each run is a fresh interpreter started with ``python -X importtime`` that
+imports the app and serves one GET /login, like a serverless cold start.
+Reported are the median wall time of the import and of the first request,
+the cumulative cost of each module app.py imports directly, and self time
+grouped by top-level package (which third-party libraries are expensive,
+whoever imports them). Tables are not created during the runs
+(DB_CREATE_ALL=false), as on a deployed instance:
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 400 --json cold_start.json
+
+With ``--budget-ms`` the exit status is 1 when the import takes longer, so
+the check can run in CI.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1e3, 'first_request_ms': (served - imported) * 1e3}))
+"""
+
+# import time:       self [us] |  cumulative | imported package
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """``(direct, packages)``: cumulative us of app.py's own imports, self us per top-level package."""
+    rows = [m.groups() for m in map(IMPORTTIME_LINE.match, stderr.splitlines()) if m]
+    direct, packages = {}, defaultdict(int)
+    # -X importtime prints children before their parent; app's direct imports are
+    # the depth-2 entries that precede the depth-1 'app' line
+    end = next((i for i, row in enumerate(rows) if row[3] == 'app' and len(row[2]) == 1), 0)
+    start = end
+    while start > 0 and len(rows[start - 1][2]) > 1:
+        start -= 1
+    for self_us, cumulative_us, indent, name in rows:
+        packages[name.split('.')[0]] += int(self_us)
+    for self_us, cumulative_us, indent, name in rows[start:end]:
+        if len(indent) == 3:
+            direct[name] = int(cumulative_us)
+    return direct, dict(packages)
+
+
+def run_once(env):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    direct, packages = parse_importtime(result.stderr)
+    return timings, direct, packages
+
+
+def median_by_key(dicts):
+    keys = {key for d in dicts for key in d}
+    return {key: statistics.median(d.get(key, 0) for d in dicts) for key in keys}
+
+
+def print_table(title, costs_us, top):
+    print(f'\n{title}')
+    for name, us in sorted(costs_us.items(), key=lambda item: -item[1])[:top]:
+        print(f'  {name:<40} {us / 1e3:>8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to take the median over')
+    parser.add_argument('--top', type=int, default=15, help='rows per table')
+    parser.add_argument('--budget-ms', type=float, help='fail when the median import takes longer')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ, DB_CREATE_ALL='false')
+    runs = [run_once(env) for _ in range(args.runs)]
+    import_ms = statistics.median(t['import_ms'] for t, _, _ in runs)
+    first_request_ms = statistics.median(t['first_request_ms'] for t, _, _ in runs)
+    direct = median_by_key([d for _, d, _ in runs])
+    packages = median_by_key([p for _, _, p in runs])
+
+    print(f'import app:     {import_ms:8.1f} ms (median of {args.runs})')
+    print(f'first request:  {first_request_ms:8.1f} ms')
+    print_table('Imported by app.py (cumulative):', direct, args.top)
+    print_table('By package (self time, wherever imported):', packages, args.top)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'import_ms': import_ms, 'first_request_ms': first_request_ms, 'runs': args.runs,
+                       'direct_ms': {k: v / 1e3 for k, v in direct.items()},
+                       'packages_ms': {k: v / 1e3 for k, v in packages.items()}}, f, indent=2)
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f'\n❌ Import took {import_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# benchmarks/load_exam_storm.py
+"""Load test: a whole class starts an exam and the timer auto-submits everyone at once.
+
+Each virtual student runs in its own thread with its own Flask test client.
+Students log in, open their profile and the exam within a ``--ramp`` window,
+then wait on a barrier and all POST the exam at the same instant, as the
+timer in exam.html does. Finally each one opens the leaderboard. Auth and
+uploads go through the local Supabase stand-in (SUPABASE_BACKEND=local),
+so nothing reaches production. The database is a throwaway SQLite file
+unless ``--database-uri`` points somewhere else, such as a scratch Postgres.
+
+Run from the repository root:
+
+    python benchmarks/load_exam_storm.py --students 60 --seed 1
+    python benchmarks/load_exam_storm.py --json out.json --baseline base.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+PASSWORD = 'load-test-password'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct * len(sorted_values) / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Latencies and failures per route label, safe to share between threads."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.windows = {}  # label -> [first start, last end]
+        self._lock = threading.Lock()
+
+    def request(self, client, label, method, url, expect=(200, 302), **kwargs):
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        end = time.perf_counter()
+        with self._lock:
+            self.samples[label].append(end - start)
+            if response.status_code not in expect:
+                self.errors[label] += 1
+            window = self.windows.setdefault(label, [start, end])
+            window[0], window[1] = min(window[0], start), max(window[1], end)
+        return response
+
+    def report(self):
+        routes = {}
+        for label, values in self.samples.items():
+            values = sorted(values)
+            first, last = self.windows[label]
+            routes[label] = {
+                'count': len(values),
+                'errors': self.errors[label],
+                'p50_ms': percentile(values, 50) * 1e3,
+                'p95_ms': percentile(values, 95) * 1e3,
+                'p99_ms': percentile(values, 99) * 1e3,
+                'max_ms': values[-1] * 1e3,
+                'throughput_rps': len(values) / max(last - first, 1e-9),
+            }
+        return routes
+
+
+def configure(args):
+    """Point the app at the local Supabase stand-in and a scratch database before importing it."""
+    os.environ['SUPABASE_BACKEND'] = 'local'
+    os.environ['SUPABASE_LOCAL_LATENCY'] = str(args.supabase_latency)
+    os.environ['SUPABASE_LOCAL_JITTER'] = str(args.supabase_jitter)
+    os.environ['SUPABASE_LOCAL_ERROR_RATE'] = '0'
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = args.database_uri or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='load-exam-'), 'load.db')}"
+    import app as exam_app
+    return exam_app
+
+
+def provision_students(exam_app, count):
+    """Register ``count`` approved students in the stand-in and the database."""
+    from models import db, User
+    students = []
+    with exam_app.app.app_context():
+        run_id = random.getrandbits(32)
+        for i in range(count):
+            email = f'load{run_id:x}-{i}@example.com'
+            response = exam_app.supabase.auth.sign_up({'email': email, 'password': PASSWORD})
+            students.append(User(supabase_uid=response.user.id, username=email.split('@')[0],
+                                 email=email, role='student', approved=True))
+        db.session.add_all(students)
+        db.session.commit()
+        return [user.email for user in students]
+
+
+def student(exam_app, recorder, email, args, barrier, q_list, seed):
+    rng = random.Random(seed)
+    exam_url = f'/exam/{args.category}/{args.section}'
+    client = exam_app.app.test_client()
+    time.sleep(rng.uniform(0, args.ramp))
+
+    page = recorder.request(client, 'GET /login', 'GET', '/login')
+    token = CSRF_RE.search(page.get_data(as_text=True))
+    recorder.request(client, 'POST /login', 'POST', '/login', expect=(302,),
+                     data={'email': email, 'password': PASSWORD, 'csrf_token': token and token.group(1)})
+    recorder.request(client, 'GET /profile', 'GET', '/profile')
+    page = recorder.request(client, 'GET /exam', 'GET', exam_url)
+    token = CSRF_RE.search(page.get_data(as_text=True))
+
+    answers = {'csrf_token': token and token.group(1)}
+    for i, (_, options, _) in enumerate(q_list):
+        if rng.random() < args.answered:
+            answers[f'q{i + 1}'] = rng.choice(options)[0]
+
+    barrier.wait()  # the exam timer runs out for everyone at once
+    recorder.request(client, 'POST /exam', 'POST', exam_url, data=answers)
+    recorder.request(client, 'GET /leaderboard', 'GET', '/leaderboard')
+
+
+def run(exam_app, args):
+    from questions import question_bank
+    q_list = question_bank.section(args.category, args.section)
+    if not q_list:
+        sys.exit(f'No questions for {args.category} {args.section}')
+
+    emails = provision_students(exam_app, args.students)
+    recorder = Recorder()
+    barrier = threading.Barrier(args.students)
+    threads = [threading.Thread(target=student, args=(exam_app, recorder, email, args, barrier, q_list,
+                                                     args.seed * 100003 + i))
+               for i, email in enumerate(emails)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    routes = recorder.report()
+    total = sum(route['count'] for route in routes.values())
+    return {'students': args.students, 'category': args.category, 'section': args.section,
+            'answered': args.answered, 'seed': args.seed, 'elapsed_s': elapsed,
+            'throughput_rps': total / elapsed, 'routes': routes}
+
+
+def print_report(result):
+    print(f"students={result['students']} exam={result['category']}/{result['section']} "
+          f"answered={result['answered']:.0%} seed={result['seed']}")
+    print(f"{'route':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}")
+    for label, route in result['routes'].items():
+        print(f"{label:<16}{route['count']:>7}{route['errors']:>8}{route['p50_ms']:>10.1f}{route['p95_ms']:>10.1f}"
+              f"{route['p99_ms']:>10.1f}{route['max_ms']:>10.1f}{route['throughput_rps']:>9.1f}")
+    print(f"total: {result['elapsed_s']:.2f}s, {result['throughput_rps']:.1f} req/s")
+
+
+def regressions(result, baseline, tolerance):
+    """Routes whose p95 grew more than ``tolerance`` (fraction) over the baseline run."""
+    found = []
+    for label, route in result['routes'].items():
+        before = baseline.get('routes', {}).get(label)
+        if before and route['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{label}: p95 {before['p95_ms']:.1f} -> {route['p95_ms']:.1f} ms")
+        if route['errors']:
+            found.append(f"{label}: {route['errors']} failed requests")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=40)
+    parser.add_argument('--category', default='Python')
+    parser.add_argument('--section', default='section1')
+    parser.add_argument('--ramp', type=float, default=2.0, help='seconds over which students open the exam')
+    parser.add_argument('--answered', type=float, default=1.0,
+                        help='fraction of questions answered before the timer fires')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--supabase-latency', type=float, default=0.05, help='seconds per stand-in call')
+    parser.add_argument('--supabase-jitter', type=float, default=0.02)
+    parser.add_argument('--database-uri', help='defaults to a fresh SQLite file')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='earlier --json output to compare p95 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth over the baseline')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    exam_app = configure(args)
+    result = run(exam_app, args)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
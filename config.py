@@ -30,11 +30,14 @@ class Config:
             database_url = f"{parsed.scheme}://{parsed.username}:{parsed.password}@{parsed.hostname}:{parsed.port}/{parsed.path}?{'&'.join(query_parts)}"
 
         SQLALCHEMY_DATABASE_URI = database_url
-        print(f"✅ Database: {parsed.hostname} (SSL enabled)")
     else:
         # Local SQLite fallback (development only)
         SQLALCHEMY_DATABASE_URI = 'sqlite:///6milan_exam.db'
-        print("⚠️  Using local SQLite (development mode)")
+
+    # Create missing tables when the app starts. Only the SQLite fallback does this by
+    # default; deployed databases are set up once with `flask init-db`, so a cold start
+    # never talks to the database (diagnostics: `flask config-summary`)
+    DB_CREATE_ALL = os.environ.get('DB_CREATE_ALL', str(not database_url)).lower() == 'true'
 
     # SQLAlchemy settings
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -45,9 +48,32 @@ class Config:
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
     SUPABASE_STORAGE_BUCKET = os.environ.get('SUPABASE_STORAGE_BUCKET', '6milan-exam-app')
 
-    # Validate Supabase config
-    if not all([SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY]):
-        print("⚠️  Missing Supabase URL or Service Role Key - uploads will fail")
+    # Auth/storage backend: 'supabase', or 'local' for the in-process stand-in
+    # used in development and load tests (see supabase_backends.py)
+    SUPABASE_BACKEND = os.environ.get('SUPABASE_BACKEND', 'supabase').lower()
+    SUPABASE_LOCAL_LATENCY = float(os.environ.get('SUPABASE_LOCAL_LATENCY', 0.05))    # seconds per call
+    SUPABASE_LOCAL_JITTER = float(os.environ.get('SUPABASE_LOCAL_JITTER', 0.02))      # +/- seconds
+    SUPABASE_LOCAL_ERROR_RATE = float(os.environ.get('SUPABASE_LOCAL_ERROR_RATE', 0))  # 0..1
+    if SUPABASE_BACKEND == 'local' and not SUPABASE_URL:
+        SUPABASE_URL = 'http://localhost:54321'  # only used to build public object URLs
+
+    # Local verification of Supabase access tokens (see supabase_tokens.py)
+    SUPABASE_VERIFY_TOKENS = os.environ.get('SUPABASE_VERIFY_TOKENS', 'False').lower() == 'true'
+    SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')  # legacy HS256 projects
+    SUPABASE_JWKS_URL = os.environ.get('SUPABASE_JWKS_URL')      # defaults to <SUPABASE_URL>/auth/v1/.well-known/jwks.json
+    SUPABASE_JWKS_CACHE_TTL = 600        # seconds
+    SUPABASE_TOKEN_REFRESH_MARGIN = 300  # refresh (in the request) when < 5 min remain
+
+    # Supabase HTTP transport (see supabase_transport.py)
+    SUPABASE_HTTP_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_HTTP_MAX_CONNECTIONS', 20))
+    SUPABASE_HTTP_MAX_KEEPALIVE = int(os.environ.get('SUPABASE_HTTP_MAX_KEEPALIVE', 10))
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_HTTP_KEEPALIVE_EXPIRY', 30))  # seconds
+    SUPABASE_HTTP_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_TIMEOUT', 10))                     # seconds
+    SUPABASE_HTTP_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_CONNECT_TIMEOUT', 3))      # seconds
+    SUPABASE_RETRIES = int(os.environ.get('SUPABASE_RETRIES', 2))             # extra attempts for idempotent calls
+    SUPABASE_BACKOFF_BASE = float(os.environ.get('SUPABASE_BACKOFF_BASE', 0.2))  # seconds, doubled per attempt
+    SUPABASE_BREAKER_THRESHOLD = int(os.environ.get('SUPABASE_BREAKER_THRESHOLD', 5))  # consecutive failures
+    SUPABASE_BREAKER_RESET = float(os.environ.get('SUPABASE_BREAKER_RESET', 30))       # seconds before a trial call
 
     # --- Engine options (optimized for Supabase) ---
     SQLALCHEMY_ENGINE_OPTIONS = {
@@ -80,6 +106,62 @@ class Config:
 
     # File upload limits
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB max upload size
+    # Streaming uploads (see uploads.py): memory per worker stays below
+    # UPLOAD_MAX_CONCURRENT * UPLOAD_READ_SIZE
+    UPLOAD_READ_SIZE = 64 * 1024            # bytes read from the spooled file per write
+    UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024     # larger files use TUS resumable uploads; Supabase requires 6MB chunks
+    UPLOAD_MAX_CONCURRENT = int(os.environ.get('UPLOAD_MAX_CONCURRENT', 4))
+    UPLOAD_SLOT_WAIT = 5                    # seconds to wait for an upload slot before giving up
+    # Background upload worker (see upload_worker.py). Off by default: on Vercel the worker
+    # threads and retry timers do not outlive the request, so only enable it on a long-lived
+    # server or with `flask process-uploads` / /cron/process-uploads scheduled (same CRON_SECRET
+    # as /cron/refresh-rollups) to finish the jobs left behind.
+    # Queued pictures are held in memory while they are written to the job row; like streaming
+    # uploads, at most UPLOAD_MAX_CONCURRENT requests do that at once.
+    UPLOAD_ASYNC = os.environ.get('UPLOAD_ASYNC', 'False').lower() == 'true'
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))
+    UPLOAD_QUEUE_SIZE = int(os.environ.get('UPLOAD_QUEUE_SIZE', 16))  # jobs in flight before running inline
+    UPLOAD_MAX_ATTEMPTS = 3
+    UPLOAD_RETRY_DELAY = 30                 # seconds before retrying a failed job, doubled per attempt
+    UPLOAD_RECOVER_INTERVAL = 60            # seconds between sweeps that requeue pending jobs
+    UPLOAD_STALE_AFTER = 300                # seconds before a 'running' job is considered abandoned
+
+    # Where profile pictures live: 'supabase' (bucket + CDN) or 'filesystem' (see storage_backends.py)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'supabase').lower()
+    MEDIA_ROOT = os.environ.get('MEDIA_ROOT') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+    MEDIA_URL_PATH = os.environ.get('MEDIA_URL_PATH', '/media/')
+    MEDIA_MAX_AGE = 300                     # seconds, for overwritable paths; hashed avatars are immutable
+    # Let a front proxy (nginx X-Accel / Apache mod_xsendfile) send media files itself
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'
+
+    # Process-local cache of logged-in user snapshots (skips a DB query per request)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # seconds
+
+    # Leaderboard edge caching (anonymous views only)
+    LEADERBOARD_S_MAXAGE = int(os.environ.get('LEADERBOARD_S_MAXAGE', 30))
+    LEADERBOARD_STALE_WHILE_REVALIDATE = int(os.environ.get('LEADERBOARD_STALE_WHILE_REVALIDATE', 300))
+
+    # Charts: time series are downsampled server-side to at most this many points
+    CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 120))
+    # Academy-wide rollups are folded in out of band: `flask refresh-rollups` from cron, or a
+    # scheduler (e.g. Vercel Cron) calling /cron/refresh-rollups with "Authorization: Bearer <CRON_SECRET>"
+    CRON_SECRET = os.environ.get('CRON_SECRET')  # /cron/* endpoints are disabled while unset
+
+    # Per-request SQL instrumentation (see query_stats.py)
+    QUERY_COUNT_WARN = int(os.environ.get('QUERY_COUNT_WARN', 25))        # queries per request
+    QUERY_TIME_WARN_MS = float(os.environ.get('QUERY_TIME_WARN_MS', 250))  # DB time per request
+    QUERY_REPEAT_WARN = int(os.environ.get('QUERY_REPEAT_WARN', 5))        # same statement N times = likely N+1
+    QUERY_SERVER_TIMING = os.environ.get('QUERY_SERVER_TIMING', 'False').lower() == 'true'  # always on in debug
+
+    # /metrics (Prometheus text format) is admin-only; set this to let scrapers in with
+    # "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Sampling request profiler (see profiler.py); admins can also send "X-Profile: 1"
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))  # fraction of all requests
+    PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.005))    # seconds between stack samples
+    PROFILER_BUFFER_SIZE = int(os.environ.get('PROFILER_BUFFER_SIZE', 20))   # profiles kept in memory
 
     # Rate limiting (optional)
     # RATELIMIT_STORAGE_URL = "redis://localhost:6379/0"
@@ -92,4 +174,19 @@ class Config:
             'X-Frame-Options': 'DENY',
             'X-XSS-Protection': '1; mode=block',
             'Referrer-Policy': 'strict-origin-when-cross-origin'
-        }
\ No newline at end of file
+        }
+
+
+def describe(config):
+    """Start-up diagnostics, shown by `flask config-summary` and `flask init-db`."""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite'):
+        lines = ["⚠️  Using local SQLite (development mode)"]
+    else:
+        ssl = " (SSL enabled)" if "sslmode=require" in uri else ""
+        lines = [f"✅ Database: {urlparse(uri).hostname}{ssl}"]
+    lines.append(f"✅ Supabase backend: {config['SUPABASE_BACKEND']}, storage: {config['STORAGE_BACKEND']}")
+    if config['SUPABASE_BACKEND'] == 'supabase' and not all([config['SUPABASE_URL'],
+                                                             config['SUPABASE_SERVICE_ROLE_KEY']]):
+        lines.append("⚠️  Missing Supabase URL or Service Role Key - uploads will fail")
+    return lines
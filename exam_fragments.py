@@ -0,0 +1,73 @@
+# exam_fragments.py
+"""Pre-rendered exam question bodies.
+
+The question markup is identical for every student, so it is rendered once
+per (category, section, bank version) and split around a handful of
+placeholders. Each request only fills those placeholders: ``checked`` for
+answers being re-displayed after a failed submit and the first validation
+error per question. The CSRF token lives outside the fragment.
+"""
+import re
+
+from flask import render_template
+from markupsafe import Markup, escape
+
+from questions import question_bank
+
+_SLOT_RE = re.compile('\x00(\\d+)\x00')
+_ERROR_HTML = '<div class="alert alert-danger mt-3 p-2">{}</div>'
+
+
+class ExamFragment:
+    """Compiled question body: static segments interleaved with per-request slots."""
+
+    def __init__(self, html, slots):
+        parts = _SLOT_RE.split(html)
+        self._segments = parts[0::2]
+        self._slots = [slots[int(slot_id)] for slot_id in parts[1::2]]
+        self._static = Markup(''.join(self._segments))
+
+    def render(self, data=None, errors=None):
+        """Return the body with answers from ``data`` checked and ``errors`` shown."""
+        if not data and not errors:
+            return self._static
+        data = data or {}
+        errors = errors or {}
+        out = [self._segments[0]]
+        for (kind, name, value), segment in zip(self._slots, self._segments[1:]):
+            if kind == 'checked':
+                if data.get(name) == value:
+                    out.append(' checked')
+            elif errors.get(name):
+                out.append(_ERROR_HTML.format(escape(errors[name][0])))
+            out.append(segment)
+        return Markup(''.join(out))
+
+
+def compile_exam_fragment(q_list):
+    """Render ``_exam_questions.html`` once and split it into an ExamFragment."""
+    slots = []
+
+    def slot(kind, name, value=None):
+        slots.append((kind, name, value))
+        return Markup(f'\x00{len(slots) - 1}\x00')
+
+    return ExamFragment(render_template('_exam_questions.html', q_list=q_list, slot=slot), slots)
+
+
+_fragments = {}
+
+def get_exam_fragment(category, section, bank=None):
+    """Return the cached fragment for a section, compiling it on first use."""
+    bank = bank or question_bank
+    key = (category, section, bank.version)
+    fragment = _fragments.get(key)
+    if fragment is None:
+        fragment = compile_exam_fragment(bank.section(category, section))
+        for stale in [k for k in _fragments if k[2] != bank.version]:
+            _fragments.pop(stale, None)
+        _fragments[key] = fragment
+    return fragment
+
+def clear_exam_fragment_cache():
+    _fragments.clear()
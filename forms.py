@@ -1,10 +1,11 @@
 # forms.py
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, BooleanField
+from wtforms import StringField, PasswordField, SubmitField, SelectField, BooleanField, RadioField
 #                          ^^^^^^^^^^^^^^ ADD THIS
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
 #                                             ^^^^^^  ^^^^^^^ ADD THESE
 from models import User
+from questions import question_bank
 
 class SignupForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -63,4 +64,33 @@ def generate_exam_form(questions):
             field_name = f"q{q['id']}_opt{idx}"
             setattr(ExamForm, field_name, BooleanField(option))
 
-    return ExamForm()
\ No newline at end of file
+    return ExamForm()
+
+# ---------------------- Exam form class cache ---------------------- #
+# Building an ExamForm means running the WTForms metaclass and constructing one
+# RadioField per question; the result only depends on the section contents, so
+# classes are cached per (category, section, bank version) and shared by all
+# requests. A new bank version simply misses the cache and evicts old entries.
+_exam_form_classes = {}
+
+def build_exam_form_class(category, section, q_list):
+    """Create a fresh ExamForm class for a list of (question, options, answer) tuples."""
+    fields = {f'q{i+1}': RadioField(q, choices=opts, validators=[DataRequired()])
+              for i, (q, opts, _) in enumerate(q_list)}
+    return type(f'{category}_{section}_ExamForm', (FlaskForm,), {**fields, 'submit': SubmitField('Submit Exam')})
+
+def get_exam_form_class(category, section, bank=None):
+    """Return the cached ExamForm class for a section, building it on first use."""
+    bank = bank or question_bank
+    key = (category, section, bank.version)
+    form_class = _exam_form_classes.get(key)
+    if form_class is None:
+        form_class = build_exam_form_class(category, section, bank.section(category, section))
+        for stale in [k for k in _exam_form_classes if k[2] != bank.version]:
+            _exam_form_classes.pop(stale, None)
+        _exam_form_classes[key] = form_class
+    return form_class
+
+def clear_exam_form_cache():
+    """Drop every cached ExamForm class (e.g. after editing questions at runtime)."""
+    _exam_form_classes.clear()
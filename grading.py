@@ -0,0 +1,97 @@
+# grading.py
+"""Answer-key grading engine, usable inside or outside a Flask request.
+
+Each section's answer key is a ``bytes`` vector of correct option indices.
+A submission is parsed once into a parallel ``bytes`` vector and scored by
+XOR-ing the two vectors as big integers, so the comparison, the correctness
+mask and the count all run in C instead of a per-question Python loop.
+"""
+from collections import namedtuple
+
+from questions import question_bank
+
+MISSING = 0xFF  # Option index used for unanswered / unknown answers
+
+# diff byte -> 1 if the answer matched (diff == 0) else 0
+_MATCH_TABLE = bytes([1] + [0] * 255)
+
+GradeResult = namedtuple('GradeResult', ['score', 'total', 'mask'])
+
+
+class AnswerKey:
+    """Compact answer key for one section."""
+
+    def __init__(self, key, options):
+        self.key = bytes(key)
+        self.total = len(self.key)
+        # One {option value: index} lookup per question, e.g. {'A': 0, 'B': 1, ...}
+        self._option_index = tuple({value: i for i, value in enumerate(values)} for values in options)
+        self._field_names = tuple(f'q{i+1}' for i in range(self.total))
+
+    @classmethod
+    def from_section(cls, q_list, key):
+        return cls(key, [[value for value, _ in opts] for _, opts, _ in q_list])
+
+    def parse(self, form):
+        """Turn a submitted mapping (``request.form``, dict) into an option-index vector."""
+        get = form.get
+        return bytes(lookup.get(get(name), MISSING)
+                     for name, lookup in zip(self._field_names, self._option_index))
+
+    def is_complete(self, answers):
+        return MISSING not in answers
+
+    def grade(self, answers):
+        """Score one parsed answer vector; returns ``GradeResult(score, total, mask)``."""
+        diff = (int.from_bytes(answers, 'big') ^ int.from_bytes(self.key, 'big')).to_bytes(self.total, 'big')
+        mask = diff.translate(_MATCH_TABLE)
+        return GradeResult(mask.count(1), self.total, mask)
+
+    def grade_form(self, form):
+        return self.grade(self.parse(form))
+
+    def grade_many(self, submissions):
+        """Grade many parsed answer vectors with a single XOR over their concatenation."""
+        submissions = list(submissions)
+        if not submissions or not self.total:
+            return [GradeResult(0, self.total, b'') for _ in submissions]
+        size = self.total * len(submissions)
+        joined = b''.join(submissions)
+        diff = (int.from_bytes(joined, 'big') ^ int.from_bytes(self.key * len(submissions), 'big')).to_bytes(size, 'big')
+        masks = diff.translate(_MATCH_TABLE)
+        results = []
+        for start in range(0, size, self.total):
+            mask = masks[start:start + self.total]
+            results.append(GradeResult(mask.count(1), self.total, mask))
+        return results
+
+
+class GradingEngine:
+    """Answer keys for every section of a QuestionBank, built lazily and cached."""
+
+    def __init__(self, bank=None):
+        self.bank = bank or question_bank
+        self._keys = {}
+
+    def key_for(self, category, section):
+        # Keyed by bank version like the form and fragment caches, so an edited
+        # bank is never graded against the answers it replaced
+        cache_key = (category, section, self.bank.version)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = AnswerKey.from_section(self.bank.section(category, section),
+                                         self.bank.answer_key(category, section))
+            for stale in [k for k in self._keys if k[2] != self.bank.version]:
+                self._keys.pop(stale, None)
+            self._keys[cache_key] = key
+        return key
+
+    def grade_form(self, category, section, form):
+        return self.key_for(category, section).grade_form(form)
+
+    def grade_many(self, category, section, forms):
+        key = self.key_for(category, section)
+        return key.grade_many(key.parse(form) for form in forms)
+
+
+grading_engine = GradingEngine()
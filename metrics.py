@@ -0,0 +1,190 @@
+# metrics.py
+"""Prometheus text-format metrics without a client library.
+
+The hot path only does a bisect and a few integer increments per request:
+per-endpoint latency histograms, an in-flight gauge and an exam-submission
+counter. Everything else (DB pool, Supabase calls, caches, query totals) is
+read from its owner when ``/metrics`` is scraped, through collectors the app
+registers with ``add_collector``.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+SUBMISSION_WINDOW = 60  # seconds, one counter each
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def histogram_lines(name, buckets, counts, total, count, **labels):
+    """Cumulative ``_bucket``/``_sum``/``_count`` lines from per-bucket (non-cumulative) counts."""
+    lines, running = [], 0
+    for bound, n in zip(buckets, counts):
+        running += n
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {running}')
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {count}')
+    lines.append(f'{name}_sum{_labels(**labels)} {total:.6f}')
+    lines.append(f'{name}_count{_labels(**labels)} {count}')
+    return lines
+
+
+class Histogram:
+    """Per-bucket counts plus sum and count for one label set."""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """Request metrics collected in-process and rendered for Prometheus."""
+
+    def __init__(self, app=None, buckets=REQUEST_BUCKETS):
+        self.buckets = buckets
+        self.in_flight = 0
+        self.requests = {}              # (endpoint, method, status class) -> Histogram
+        self.submissions = 0
+        self._submission_seconds = [-1] * SUBMISSION_WINDOW   # ring slot -> the second it counts
+        self._submission_counts = [0] * SUBMISSION_WINDOW
+        self._collectors = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self.record_status)
+        app.teardown_request(self._finish)
+        app.extensions['metrics'] = self
+
+    # Hot path
+    def _start(self):
+        g._metrics_start = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+
+    def _finish(self, exc=None):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        status = 500 if exc is not None else getattr(g, '_metrics_status', 200)
+        key = (request.endpoint or 'unmatched', request.method, f'{status // 100}xx')
+        slot = bisect_left(self.buckets, elapsed)
+        with self._lock:
+            self.in_flight -= 1
+            hist = self.requests.get(key)
+            if hist is None:
+                hist = self.requests[key] = Histogram(len(self.buckets))
+            if slot < len(self.buckets):
+                hist.counts[slot] += 1
+            hist.sum += elapsed
+            hist.count += 1
+
+    def record_status(self, response):
+        """after_request hook: teardown handlers never see the response."""
+        g._metrics_status = response.status_code
+        return response
+
+    def exam_submitted(self):
+        second = int(time.monotonic())
+        slot = second % SUBMISSION_WINDOW
+        with self._lock:
+            self.submissions += 1
+            if self._submission_seconds[slot] != second:  # slot last used a minute or more ago
+                self._submission_seconds[slot] = second
+                self._submission_counts[slot] = 0
+            self._submission_counts[slot] += 1
+
+    def submissions_last_minute(self):
+        now = int(time.monotonic())
+        with self._lock:
+            return sum(count for second, count in zip(self._submission_seconds, self._submission_counts)
+                       if now - second < SUBMISSION_WINDOW)
+
+    # Scrape path
+    def add_collector(self, collector):
+        """Register ``collector() -> [lines]``, called on every scrape."""
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        with self._lock:
+            snapshot = [(key, list(h.counts), h.sum, h.count) for key, h in self.requests.items()]
+            in_flight, submissions = self.in_flight, self.submissions
+        lines = ['# HELP http_request_duration_seconds Request latency by endpoint.',
+                 '# TYPE http_request_duration_seconds histogram']
+        for (endpoint, method, status), counts, total, count in sorted(snapshot):
+            lines += histogram_lines('http_request_duration_seconds', self.buckets, counts, total, count,
+                                     endpoint=endpoint, method=method, status=status)
+        lines += ['# HELP http_requests_in_flight Requests currently being served.',
+                  '# TYPE http_requests_in_flight gauge',
+                  f'http_requests_in_flight {in_flight}',
+                  '# HELP exam_submissions_total Graded exam submissions.',
+                  '# TYPE exam_submissions_total counter',
+                  f'exam_submissions_total {submissions}',
+                  '# HELP exam_submissions_last_minute Graded exam submissions in the last 60 seconds.',
+                  '# TYPE exam_submissions_last_minute gauge',
+                  f'exam_submissions_last_minute {self.submissions_last_minute()}']
+        for collector in self._collectors:
+            try:
+                lines += collector()
+            except Exception as e:  # a broken collector must not take the endpoint down
+                print(f"Metrics collector error: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def pool_lines(engine):
+    """Connection pool gauges for a SQLAlchemy engine (QueuePool-style pools only)."""
+    pool = engine.pool
+    lines = []
+    for name, attr, help_text in (('db_pool_size', 'size', 'Configured pool size.'),
+                                  ('db_pool_checked_out', 'checkedout', 'Connections in use.'),
+                                  ('db_pool_checked_in', 'checkedin', 'Idle pooled connections.'),
+                                  ('db_pool_overflow', 'overflow', 'Connections beyond pool_size (negative until the pool fills).')):
+        if hasattr(pool, attr):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {getattr(pool, attr)()}']
+    return lines
+
+
+def operation_lines(snapshot, buckets):
+    """Supabase call histograms and error counters from OperationMetrics.snapshot()."""
+    lines = ['# HELP supabase_call_duration_seconds Supabase call latency by operation.',
+             '# TYPE supabase_call_duration_seconds histogram']
+    for operation, op in sorted(snapshot.items()):
+        # OperationMetrics buckets are already cumulative, histogram_lines wants per-bucket counts
+        per_bucket = [n - prev for n, prev in zip(op['buckets'], [0] + op['buckets'][:-1])]
+        lines += histogram_lines('supabase_call_duration_seconds', buckets, per_bucket, op['sum'], op['count'],
+                                 operation=operation)
+    lines += ['# HELP supabase_call_errors_total Failed Supabase calls by operation.',
+              '# TYPE supabase_call_errors_total counter']
+    lines += [f'supabase_call_errors_total{_labels(operation=operation)} {op["errors"]}'
+              for operation, op in sorted(snapshot.items())]
+    return lines
+
+
+def cache_lines(caches):
+    """Hit/miss counters and hit ratio for ``{name: (hits, misses)}``."""
+    lines = ['# HELP cache_hits_total Cache hits.', '# TYPE cache_hits_total counter']
+    lines += [f'cache_hits_total{_labels(cache=name)} {hits}' for name, (hits, _) in caches.items()]
+    lines += ['# HELP cache_misses_total Cache misses.', '# TYPE cache_misses_total counter']
+    lines += [f'cache_misses_total{_labels(cache=name)} {misses}' for name, (_, misses) in caches.items()]
+    lines += ['# HELP cache_hit_ratio Hits / (hits + misses) since start.', '# TYPE cache_hit_ratio gauge']
+    lines += [f'cache_hit_ratio{_labels(cache=name)} {hits / (hits + misses) if hits + misses else 0:.4f}'
+              for name, (hits, misses) in caches.items()]
+    return lines
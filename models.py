@@ -10,10 +10,13 @@ db = SQLAlchemy()
 
 # models.py - Recommended version for Supabase Auth
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.expression import ClauseElement
 
 db = SQLAlchemy()
 
@@ -31,6 +34,10 @@ class User(db.Model, UserMixin):
     # NO password_hash column! Supabase handles passwords
 
     scores = db.relationship('Score', backref='user', lazy=True, cascade="all, delete-orphan")
+    stats = db.relationship('UserStats', uselist=False, lazy=True, cascade="all, delete-orphan")
+    category_stats = db.relationship('UserCategoryStats', lazy=True, cascade="all, delete-orphan")
+    score_rollups = db.relationship('UserScoreRollup', lazy=True, cascade="all, delete-orphan")
+    upload_jobs = db.relationship('UploadJob', lazy=True, cascade="all, delete-orphan")
 
     def get_id(self):
         return str(self.id)
@@ -38,12 +45,19 @@ class User(db.Model, UserMixin):
     def set_email(self, email):
         self.email = email.lower().strip()
 
+    # Aggregates come from the materialized UserStats row, created by record_score()
+    # (seeded from all of the user's scores) or `flask backfill-user-stats`. Users
+    # with no row yet fall back to walking self.scores.
     @property
     def total_score(self):
+        if self.stats is not None:
+            return self.stats.total_score
         return sum(score.score for score in self.scores)
 
     @property
     def total_exams(self):
+        if self.stats is not None:
+            return self.stats.total_exams
         return len(self.scores)
 
     @property
@@ -69,4 +83,362 @@ class Score(db.Model):
     )
 
     def __repr__(self):
-        return f'<Score {self.score} in {self.category} on {self.date.strftime("%Y-%m-%d")}>'
\ No newline at end of file
+        return f'<Score {self.score} in {self.category} on {self.date.strftime("%Y-%m-%d")}>'
+
+
+# ---------------------- Materialized score aggregates ---------------------- #
+class UserStats(db.Model):
+    """One row per user, updated in the same transaction as every Score insert."""
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_score = db.Column(db.Integer, nullable=False, default=0)
+    total_exams = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=True)
+    last_attempt = db.Column(db.DateTime(timezone=True), nullable=True, index=True)
+
+    @property
+    def average_score(self):
+        return round(self.total_score / self.total_exams, 1) if self.total_exams else 0
+
+    def __repr__(self):
+        return f'<UserStats user={self.user_id} total={self.total_score} exams={self.total_exams}>'
+
+class UserCategoryStats(db.Model):
+    """Per-user, per-category (e.g. ``Python_section1``) score sum and count."""
+    __tablename__ = 'user_category_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    exam_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def average_score(self):
+        return round(self.score_sum / self.exam_count, 1) if self.exam_count else 0
+
+# ---------------------- Time-bucketed rollups ---------------------- #
+ROLLUP_PERIODS = ('day', 'week')
+ROLLUP_WATERMARK = 'score_rollups'  # SharedCounter: last Score id folded into ScoreRollup
+ROLLUP_LAG = 30                     # seconds; see refresh_score_rollups()
+
+def bucket_start(date, period):
+    """UTC day, or the Monday starting the UTC week, that ``date`` falls in."""
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc)
+    day = date.date()
+    return day - timedelta(days=day.weekday()) if period == 'week' else day
+
+class ScoreRollup(db.Model):
+    """Academy-wide count/sum/min/max per (period, bucket, category).
+
+    Every student in a class writes the same (bucket, category) rows, so these
+    are not touched on submit: refresh_score_rollups() folds new scores in
+    batches. Only per-category rows are kept; the all-category series is
+    summed at read time.
+    """
+    __tablename__ = 'score_rollups'
+    period = db.Column(db.String(8), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    min_score = db.Column(db.Integer, nullable=True)
+    max_score = db.Column(db.Integer, nullable=True)
+
+class UserScoreRollup(db.Model):
+    """Per-student count/sum/min/max per (period, bucket), for the profile chart."""
+    __tablename__ = 'user_score_rollups'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.String(8), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    min_score = db.Column(db.Integer, nullable=True)
+    max_score = db.Column(db.Integer, nullable=True)
+
+def _upsert(model, values, update):
+    """INSERT ... ON CONFLICT (primary key) DO UPDATE, atomic on SQLite and Postgres.
+
+    ``update(excluded)`` returns the SET clause; ``model.<column>`` is the
+    existing row and ``excluded.<column>`` the row that was being inserted.
+    Unlike update-then-insert, concurrent first writes cannot collide.
+    ``values`` is one row (SQL expressions allowed) or a list of plain rows,
+    sent as one executemany. Other databases go through _locked_upsert().
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in values if isinstance(values, list) else [values]:
+            _locked_upsert(model, row, update)
+        return
+    if isinstance(values, list):
+        if not values:
+            return
+        stmt, params = insert(model), values
+    else:
+        stmt, params = insert(model).values(**values), None
+    keys = [column.name for column in model.__table__.primary_key]
+    db.session.execute(stmt.on_conflict_do_update(index_elements=keys, set_=update(stmt.excluded)), params)
+
+def _locked_upsert(model, values, update):
+    """Portable upsert: SELECT ... FOR UPDATE, then UPDATE or INSERT.
+
+    An INSERT that loses a race with a concurrent first write is rolled back
+    to a savepoint and retried as an UPDATE.
+    """
+    table = model.__table__
+    match = [column == values[column.name] for column in table.primary_key]
+    excluded = SimpleNamespace(**{
+        name: value if isinstance(value, ClauseElement) else db.literal(value, table.c[name].type)
+        for name, value in values.items()})
+    found = db.session.execute(db.select(*table.primary_key).where(*match).with_for_update()).first()
+    if found is None:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(model).values(**values))
+            return
+        except IntegrityError:
+            pass
+    db.session.execute(db.update(model).where(*match).values(**update(excluded))
+                       .execution_options(synchronize_session=False))
+
+def _has_row(*criteria):
+    return db.session.execute(db.select(db.literal(1)).where(*criteria).limit(1)).first() is not None
+
+def _fold_rollup(model, keys, count, total, low, high):
+    """Add count/total/min/max into a rollup row, creating it on first use."""
+    _fold_rollups(model, dict(keys, count=count, total=total, min_score=low, max_score=high))
+
+def _fold_rollups(model, rows):
+    """_fold_rollup() for one row dict or a list of them."""
+    _upsert(model, rows,
+            lambda new: dict(count=model.count + new.count,
+                             total=model.total + new.total,
+                             min_score=db.case((model.min_score > new.min_score, new.min_score),
+                                               else_=model.min_score),
+                             max_score=db.case((model.max_score < new.max_score, new.max_score),
+                                               else_=model.max_score)))
+
+def record_score(user_id, category, score, date=None):
+    """Add a Score and fold it into the user's aggregates (caller commits).
+
+    Rows are upserted with ``col = col + :value`` so concurrent submissions
+    for the same user (two tabs, a double click) never lose an increment or
+    collide on the first insert.
+    """
+    date = date or datetime.now(timezone.utc)
+    new_score = Score(user_id=user_id, category=category, score=score, date=date)
+    db.session.add(new_score)
+
+    # A user's first row is seeded from all their scores (this one included), so
+    # scores recorded before the aggregate tables existed are never left out
+    mine = Score.user_id == user_id
+    if _has_row(UserStats.user_id == user_id):
+        stats = dict(user_id=user_id, total_score=score, total_exams=1, best_score=score, last_attempt=date)
+    else:
+        db.session.flush()
+        stats = dict(user_id=user_id,
+                     total_score=db.select(func.sum(Score.score)).where(mine).scalar_subquery(),
+                     total_exams=db.select(func.count(Score.id)).where(mine).scalar_subquery(),
+                     best_score=db.select(func.max(Score.score)).where(mine).scalar_subquery(),
+                     last_attempt=db.select(func.max(Score.date)).where(mine).scalar_subquery())
+    _upsert(UserStats, stats, lambda new: dict(
+        total_score=UserStats.total_score + score,
+        total_exams=UserStats.total_exams + 1,
+        best_score=db.case((UserStats.best_score.is_(None) | (UserStats.best_score < score), score),
+                           else_=UserStats.best_score),
+        last_attempt=db.case((UserStats.last_attempt.is_(None) | (UserStats.last_attempt < date), date),
+                             else_=UserStats.last_attempt)))
+
+    in_category = UserCategoryStats.user_id == user_id, UserCategoryStats.category == category
+    if _has_row(*in_category):
+        category_stats = dict(user_id=user_id, category=category, score_sum=score, exam_count=1)
+    else:
+        db.session.flush()
+        of_category = mine, Score.category == category
+        category_stats = dict(user_id=user_id, category=category,
+                              score_sum=db.select(func.sum(Score.score)).where(*of_category).scalar_subquery(),
+                              exam_count=db.select(func.count(Score.id)).where(*of_category).scalar_subquery())
+    _upsert(UserCategoryStats, category_stats,
+            lambda new: dict(score_sum=UserCategoryStats.score_sum + score,
+                             exam_count=UserCategoryStats.exam_count + 1))
+
+    # Only this user's rows; the academy-wide rollups are refreshed out of band
+    for period in ROLLUP_PERIODS:
+        _fold_rollup(UserScoreRollup, {'user_id': user_id, 'period': period,
+                                       'bucket_start': bucket_start(date, period)}, 1, score, score, score)
+    return new_score
+
+def rebuild_user_stats():
+    """Recompute every aggregate row from the scores table with set-based SQL."""
+    db.session.execute(db.delete(UserCategoryStats))
+    db.session.execute(db.delete(UserStats))
+    db.session.execute(db.insert(UserStats).from_select(
+        ['user_id', 'total_score', 'total_exams', 'best_score', 'last_attempt'],
+        db.select(Score.user_id, func.sum(Score.score), func.count(Score.id),
+                  func.max(Score.score), func.max(Score.date))
+        .group_by(Score.user_id)
+    ))
+    db.session.execute(db.insert(UserCategoryStats).from_select(
+        ['user_id', 'category', 'score_sum', 'exam_count'],
+        db.select(Score.user_id, Score.category, func.sum(Score.score), func.count(Score.id))
+        .group_by(Score.user_id, Score.category)
+    ))
+    db.session.commit()
+
+def _fold(buckets, key, score):
+    row = buckets.get(key)
+    if row is None:
+        buckets[key] = [1, score, score, score]
+    else:
+        row[0] += 1
+        row[1] += score
+        row[2] = min(row[2], score)
+        row[3] = max(row[3], score)
+
+def refresh_score_rollups(lag=ROLLUP_LAG, batch_size=10000):
+    """Fold scores added since the last refresh into ScoreRollup; returns how many.
+
+    A ``shared_counters`` watermark holds the last folded Score id. Only ids
+    up to the highest one dated more than ``lag`` seconds ago are folded, so
+    slower transactions that took a lower id have committed by then. Each batch
+    first moves the watermark with a conditional UPDATE: a concurrent
+    refresher blocks on that row, then matches nothing and stops.
+    """
+    watermark = db.session.execute(
+        db.select(SharedCounter.value).where(SharedCounter.name == ROLLUP_WATERMARK)).scalar()
+    if watermark is None:
+        if db.session.execute(db.select(ScoreRollup.period).limit(1)).first() is not None:
+            # Rollups written by an older version: recount the academy table once
+            return rebuild_rollups(batch_size, per_user=False)
+        _upsert(SharedCounter, dict(name=ROLLUP_WATERMARK, value=0, updated_at=datetime.now(timezone.utc)),
+                lambda new: dict(value=SharedCounter.value))
+        db.session.commit()
+        watermark = 0
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=lag)
+    upper = db.session.execute(db.select(func.max(Score.id)).where(Score.date <= cutoff)).scalar()
+    folded = 0
+    while upper is not None and watermark < upper:
+        rows = db.session.execute(
+            db.select(Score.id, Score.category, Score.score, Score.date)
+            .where(Score.id > watermark, Score.id <= upper).order_by(Score.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        claimed = db.session.execute(
+            db.update(SharedCounter)
+            .where(SharedCounter.name == ROLLUP_WATERMARK, SharedCounter.value == watermark)
+            .values(value=rows[-1].id, updated_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            break
+        buckets = {}
+        for _, category, score, date in rows:
+            for period in ROLLUP_PERIODS:
+                _fold(buckets, (period, bucket_start(date, period), category), score)
+        _fold_rollups(ScoreRollup, [
+            {'period': period, 'bucket_start': start, 'category': category,
+             'count': c, 'total': t, 'min_score': lo, 'max_score': hi}
+            for (period, start, category), (c, t, lo, hi) in buckets.items()])
+        db.session.commit()
+        watermark = rows[-1].id
+        folded += len(rows)
+    return folded
+
+def rebuild_rollups(batch_size=10000, per_user=True):
+    """Recompute the rollup tables from the scores table; returns the scores folded.
+
+    Bucketing is done in Python while streaming scores ordered by user (date
+    truncation SQL differs between SQLite and Postgres). Academy buckets are
+    few (days x categories); a user's buckets are queued for insert as soon as
+    their scores end, so memory holds one user's buckets plus one batch.
+    """
+    db.session.execute(db.delete(ScoreRollup))
+    if per_user:
+        db.session.execute(db.delete(UserScoreRollup))
+
+    academy, user_buckets, pending = {}, {}, []
+    current_user_id = None
+    last_id = folded = 0
+
+    def queue_user_buckets():
+        pending.extend({'user_id': current_user_id, 'period': period, 'bucket_start': start,
+                        'count': c, 'total': t, 'min_score': lo, 'max_score': hi}
+                       for (period, start), (c, t, lo, hi) in user_buckets.items())
+        user_buckets.clear()
+        if len(pending) >= batch_size:
+            _bulk_insert(UserScoreRollup, pending, batch_size)
+            pending.clear()
+
+    rows = db.session.execute(
+        db.select(Score.id, Score.user_id, Score.category, Score.score, Score.date)
+        .order_by(Score.user_id).execution_options(yield_per=batch_size)
+    )
+    for score_id, user_id, category, score, date in rows:
+        if per_user and user_id != current_user_id:
+            queue_user_buckets()
+            current_user_id = user_id
+        last_id = max(last_id, score_id)
+        folded += 1
+        for period in ROLLUP_PERIODS:
+            start = bucket_start(date, period)
+            _fold(academy, (period, start, category), score)
+            if per_user:
+                _fold(user_buckets, (period, start), score)
+    if per_user:
+        queue_user_buckets()
+        _bulk_insert(UserScoreRollup, pending, batch_size)
+
+    _bulk_insert(ScoreRollup, [
+        {'period': period, 'bucket_start': start, 'category': category,
+         'count': c, 'total': t, 'min_score': lo, 'max_score': hi}
+        for (period, start, category), (c, t, lo, hi) in academy.items()], batch_size)
+    db.session.execute(db.delete(SharedCounter).where(SharedCounter.name == ROLLUP_WATERMARK))
+    db.session.add(SharedCounter(name=ROLLUP_WATERMARK, value=last_id, updated_at=datetime.now(timezone.utc)))
+    db.session.commit()
+    return folded
+
+def _bulk_insert(model, rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(db.insert(model), rows[i:i + batch_size])
+
+# ---------------------- Shared counters ---------------------- #
+class SharedCounter(db.Model):
+    """Named integers every app instance reads, e.g. change counters behind cache keys."""
+    __tablename__ = 'shared_counters'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+def bump_counter(name):
+    """Increment a SharedCounter in the current transaction (caller commits)."""
+    _upsert(SharedCounter, dict(name=name, value=1, updated_at=datetime.now(timezone.utc)),
+            lambda new: dict(value=SharedCounter.value + 1, updated_at=new.updated_at))
+
+# ---------------------- Background uploads ---------------------- #
+class UploadJob(db.Model):
+    """A validated profile picture waiting for (or done with) the upload worker.
+
+    The bytes live in the row until the upload succeeds, so jobs survive a
+    restart and are picked up again by ``upload_worker.UploadWorker.recover``.
+    """
+    __tablename__ = 'upload_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)  # pending/running/done/failed
+    ext = db.Column(db.String(8), nullable=False)
+    mimetype = db.Column(db.String(32), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=True)  # cleared once stored
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<UploadJob {self.id} user={self.user_id} {self.status}>'
@@ -0,0 +1,137 @@
+# profiler.py
+"""Opt-in sampling profiler for individual requests.
+
+A profiled request gets a sampler thread that reads the request thread's
+stack every ``PROFILER_INTERVAL`` seconds via ``sys._current_frames()``.
+The request itself runs uninstrumented, so a profile costs one sleeping
+thread instead of a tracing hook on every call. Requests are picked by
+``PROFILER_SAMPLE_RATE`` or, for admins, by sending ``X-Profile: 1``. The
+last ``PROFILER_BUFFER_SIZE`` profiles are kept in memory as collapsed
+stacks (``frame;frame;frame count``), the input format of flamegraph.pl
+and speedscope.
+"""
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+PROFILE_HEADER = 'X-Profile'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """``root;...;leaf`` for a frame and its callers."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Samples one thread's stack until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class Profile:
+    def __init__(self, profile_id, method, path, endpoint, status, seconds, stacks):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.status = status
+        self.seconds = seconds
+        self.stacks = stacks
+        self.created = datetime.now(timezone.utc)
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        return {'id': self.id, 'method': self.method, 'path': self.path, 'endpoint': self.endpoint,
+                'status': self.status, 'duration_ms': round(self.seconds * 1000, 1),
+                'samples': self.samples, 'created': self.created.isoformat()}
+
+
+class RequestProfiler:
+    """Flask glue: decides which requests to sample and keeps the ring buffer."""
+
+    def __init__(self, app=None):
+        self.profiles = deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.profiles = deque(maxlen=app.config['PROFILER_BUFFER_SIZE'])
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['profiler'] = self
+
+    def _wanted(self):
+        rate = current_app.config['PROFILER_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            return True
+        return (request.headers.get(PROFILE_HEADER) == '1'
+                and current_user.is_authenticated and current_user.role == 'admin')
+
+    def _start(self):
+        if not self._wanted():
+            return
+        sampler = Sampler(threading.get_ident(), current_app.config['PROFILER_INTERVAL'])
+        g._profiler = (sampler, time.perf_counter())
+        sampler.start()
+
+    def _finish(self, response):
+        started = g.pop('_profiler', None)
+        if started is None:
+            return response
+        sampler, start = started
+        stacks = sampler.stop()
+        profile = Profile(next(self._ids), request.method, request.full_path.rstrip('?'), request.endpoint,
+                          response.status_code, time.perf_counter() - start, stacks)
+        with self._lock:
+            self.profiles.append(profile)
+        response.headers['X-Profile-Id'] = str(profile.id)
+        return response
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def recent(self):
+        with self._lock:
+            return list(reversed(self.profiles))
@@ -0,0 +1,93 @@
+# query_stats.py
+"""Per-request SQL instrumentation hooked into SQLAlchemy engine events.
+
+Every statement run while handling a request is counted and timed. When a
+request runs too many queries, spends too long in the database, or repeats
+the same statement many times (the usual N+1 signature: a lazy relationship
+loaded once per row), a warning is printed with the offending statement. In
+debug mode (or with QUERY_SERVER_TIMING) the numbers are also sent as a
+``Server-Timing`` header, so they show up in the browser's network panel.
+"""
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestQueries:
+    """Statements seen while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self.started = time.perf_counter()
+
+    def repeated(self, threshold):
+        """``(statement, times)`` for statements run at least ``threshold`` times."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if has_request_context():
+        queries = g.get('_queries')
+        if queries is not None:
+            queries.count += 1
+            queries.seconds += time.perf_counter() - started
+            queries.statements[statement] += 1
+
+
+class QueryStats:
+    """Flask glue: per-request query counting, warnings and Server-Timing."""
+
+    def __init__(self, app=None):
+        self.requests = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Listening on the Engine class covers engines created after this call too
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['query_stats'] = self
+
+    def _start(self):
+        g._queries = RequestQueries()
+
+    def _finish(self, response):
+        queries = g.pop('_queries', None)
+        if queries is None:
+            return response
+        with self._lock:
+            self.requests += 1
+            self.queries += queries.count
+            self.seconds += queries.seconds
+
+        config = current_app.config
+        repeated = queries.repeated(config['QUERY_REPEAT_WARN'])
+        if (queries.count > config['QUERY_COUNT_WARN'] or repeated
+                or queries.seconds * 1000 > config['QUERY_TIME_WARN_MS']):
+            print(f"⚠️  {request.method} {request.path}: {queries.count} queries, "
+                  f"{queries.seconds * 1000:.1f} ms in the database")
+            for sql, n in repeated:
+                print(f"    possible N+1, {n}x: {' '.join(sql.split())[:160]}")
+
+        if config.get('QUERY_SERVER_TIMING') or current_app.debug:
+            total_ms = (time.perf_counter() - queries.started) * 1000
+            response.headers.add('Server-Timing', f'db;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries"')
+            response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+        return response
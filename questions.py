@@ -431,25 +431,106 @@ questions = {
         'section2_author': None
     }
 }
+# ---------------------- Compiled question bank ---------------------- #
+import hashlib
+import json
+from types import MappingProxyType
+
+SECTIONS = ('section1', 'section2')
+
+
+class QuestionBank:
+    """Immutable index over the raw ``questions`` dict, built once at import.
+
+    Every (category, section) pair is compiled into a frozen tuple of
+    ``(question, options, answer)`` tuples together with its count, author
+    and an answer key (``bytes`` of option indices), so request handlers do
+    O(1) lookups instead of walking and re-slicing the nested literal.
+    """
+
+    def __init__(self, raw):
+        sections, authors, answer_keys, section_info = {}, {}, {}, {}
+        for category, data in raw.items():
+            if isinstance(data, list):  # Old format
+                compiled = {'section1': _freeze(data), 'section2': ()}
+                category_authors = {'section1': 'Legacy', 'section2': None}
+                info_authors = category_authors
+            else:
+                compiled = {s: _freeze(data.get(s, [])) for s in SECTIONS}
+                category_authors = {s: data.get(f'{s}_author') for s in SECTIONS}
+                info_authors = {s: data.get(f'{s}_author', 'Unknown') for s in SECTIONS}
+
+            for section in SECTIONS:
+                sections[(category, section)] = compiled[section]
+                authors[(category, section)] = category_authors[section]
+                answer_keys[(category, section)] = _answer_key(compiled[section])
+
+            section_info[category] = MappingProxyType({
+                'section1_count': len(compiled['section1']),
+                'section2_count': len(compiled['section2']),
+                'section1_author': info_authors['section1'],
+                'section2_author': info_authors['section2'],
+            })
+
+        self._categories = tuple(raw.keys())
+        self._sections = sections
+        self._authors = authors
+        self._answer_keys = answer_keys
+        self.section_info = MappingProxyType(section_info)
+        self.content_hash = hashlib.sha256(
+            json.dumps(raw, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+
+    @property
+    def version(self):
+        """Short, stable identifier of the bank contents (used as a cache key)."""
+        return self.content_hash[:16]
+
+    @property
+    def categories(self):
+        return self._categories
+
+    def __contains__(self, category):
+        return category in self.section_info
+
+    def section(self, category, section):
+        """Frozen question tuples for a section, or ``()`` if unknown."""
+        return self._sections.get((category, section), ())
+
+    def count(self, category, section):
+        return len(self.section(category, section))
+
+    def author(self, category, section):
+        return self._authors.get((category, section))
+
+    def answer_key(self, category, section):
+        """Correct option index per question, packed into ``bytes``."""
+        return self._answer_keys.get((category, section), b'')
+
+    def all_questions(self, category):
+        return self.section(category, 'section1') + self.section(category, 'section2')
+
+
+def _freeze(q_list):
+    return tuple((text, tuple(tuple(opt) for opt in opts), ans) for text, opts, ans in q_list)
+
+
+def _answer_key(q_list):
+    return bytes([[value for value, _ in opts].index(ans) for _, opts, ans in q_list])
+
+
+question_bank = QuestionBank(questions)
+
 
 # Helper function for backward compatibility
 def get_all_questions(category):
     """Returns all questions for a category (section1 + section2) for backward compatibility"""
-    if category not in questions:
-        return []
-    data = questions[category]
-    if isinstance(data, list):  # Old format
-        return data
-    return data['section1'] + data['section2']
+    return question_bank.all_questions(category)
 
 def get_section_questions(category, section):
     """Get questions for specific section"""
-    if category not in questions or section not in ['section1', 'section2']:
-        return []
-    return questions[category][section]
+    return question_bank.section(category, section)
 
 def get_section_author(category, section):
     """Get author of specific section"""
-    if category not in questions:
-        return None
-    return questions[category].get(f'{section}_author')
\ No newline at end of file
+    return question_bank.author(category, section)
@@ -0,0 +1,172 @@
+# rankings.py
+"""Leaderboard queries computed entirely in SQL.
+
+Everything reads the materialized ``user_stats`` table, so a page view never
+loads individual Score rows into Python. Every sort order ends in ``User.id``,
+which makes it a total order:
+
+- a page is the next ``limit`` rows after a keyset cursor (the id of the last
+  student shown), so deep pages cost the same as the first one. Rank numbers
+  are recomputed from that student's position, never taken from the cursor
+- a student's rank is one plus the number of students whose sort key comes
+  first, a single COUNT instead of ranking the whole table
+
+Pages are cached per (sort, cursor) and tagged with a data version every
+instance agrees on: the newest Score id and last attempt (both index
+lookups) plus a ``shared_counters`` row that approvals, rejections, renames
+and avatar changes bump in their own transaction.
+"""
+import hashlib
+import time
+
+from sqlalchemy import func
+
+from models import db, Score, SharedCounter, User, UserStats, bump_counter
+
+PAGE_SIZE = 10
+
+# total_score * 1.0 keeps the division fractional on both SQLite and Postgres
+AVERAGE = func.round(UserStats.total_score * 1.0 / UserStats.total_exams, 1)
+
+# (expression, descending?) pairs; User.id ascending breaks any remaining tie
+SORT_KEYS = {
+    'average_desc': ((AVERAGE, True), (UserStats.total_exams, True)),
+    'average_asc': ((AVERAGE, False), (UserStats.total_exams, True)),
+    'exams_desc': ((UserStats.total_exams, True), (AVERAGE, True)),
+    'score_desc': ((UserStats.total_score, True), (AVERAGE, True)),
+}
+SORT_ORDERS = {sort: tuple(expr.desc() if desc else expr.asc() for expr, desc in keys) + (User.id.asc(),)
+               for sort, keys in SORT_KEYS.items()}
+DEFAULT_SORT = 'average_desc'
+
+# Approved students with at least one exam
+ON_BOARD = (User.role == 'student', User.approved == True, UserStats.total_exams > 0)
+
+
+def _board(*columns):
+    return db.select(*columns).select_from(User).join(UserStats, UserStats.user_id == User.id).where(*ON_BOARD)
+
+
+def _ahead_of(keys, values, user_id):
+    """Condition for students ranked before one with sort-key ``values`` and id ``user_id``."""
+    clauses, ties = [], []
+    for (expr, desc), value in zip(keys, values):
+        better = expr > value if desc else expr < value
+        clauses.append(db.and_(*ties, better) if ties else better)
+        ties.append(expr == value)
+    clauses.append(db.and_(*ties, User.id < user_id))
+    return db.or_(*clauses)
+
+
+def _sort_values(keys, user_id):
+    """One student's sort-key values, or None if they are not on the board."""
+    return db.session.execute(
+        _board(*[expr for expr, _ in keys]).where(User.id == user_id)
+    ).first()
+
+
+def parse_cursor(value):
+    """The user id in an ``after`` query parameter, or None.
+
+    Older links carry ``'rank:user_id'``; their rank part is ignored.
+    """
+    try:
+        user_id = int(str(value or '').rsplit(':', 1)[-1])
+    except ValueError:
+        return None
+    return user_id if user_id > 0 else None
+
+
+def leaderboard_page(sort=DEFAULT_SORT, after=None, limit=PAGE_SIZE):
+    """Return one page of ranked rows following the ``after`` cursor (see parse_cursor).
+
+    Result keys: ``rows``, ``total_students``, ``all_avg`` and ``next_after``
+    (the cursor for the following page, or None on the last page).
+    """
+    keys = SORT_KEYS.get(sort, SORT_KEYS[DEFAULT_SORT])
+    query = (_board(User.id, User.username, User.email, User.profile_pic,
+                    UserStats.total_exams, UserStats.total_score, AVERAGE.label('average'))
+             .order_by(*SORT_ORDERS.get(sort, SORT_ORDERS[DEFAULT_SORT]))
+             .limit(limit + 1))
+    totals = [func.count(), func.avg(AVERAGE)]
+    values = _sort_values(keys, after) if after is not None else None
+    if values is not None:  # else no cursor, or its student left the board: start over
+        ahead = _ahead_of(keys, values, after)
+        query = query.where(~ahead, User.id != after)
+        totals.append(func.sum(db.case((ahead, 1), else_=0)))  # the cursor student's rank - 1
+
+    rows = db.session.execute(query).all()
+    total_students, all_avg, *ahead_count = db.session.execute(_board(*totals)).one()
+    first_rank = (ahead_count[0] or 0) + 2 if ahead_count else 1
+    has_more = len(rows) > limit
+    rows = [dict(row._mapping, rank=first_rank + i) for i, row in enumerate(rows[:limit])]
+
+    return {
+        'rows': rows,
+        'total_students': total_students or 0,
+        'all_avg': round(float(all_avg), 1) if all_avg is not None else 0,
+        'next_after': rows[-1]['id'] if has_more else None,
+    }
+
+
+def leaderboard_rank(user_id, sort=DEFAULT_SORT):
+    """One student's rank and stats (or None if they are not on the board)."""
+    keys = SORT_KEYS.get(sort, SORT_KEYS[DEFAULT_SORT])
+    row = db.session.execute(
+        _board(UserStats.total_exams, UserStats.total_score, AVERAGE.label('average'),
+               *[expr for expr, _ in keys]).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    ahead, total_students = db.session.execute(
+        _board(func.sum(db.case((_ahead_of(keys, row[3:], user_id), 1), else_=0)), func.count())
+    ).one()
+    return {'rank': (ahead or 0) + 1, 'total_students': total_students,
+            'total_exams': row.total_exams, 'total_score': row.total_score, 'average': row.average}
+
+
+# ---------------------- Versioned page cache ---------------------- #
+CACHE_TTL = 60          # seconds; bounds memory held for pages nobody asks for
+CACHE_MAX_ENTRIES = 256
+LEADERBOARD_COUNTER = 'leaderboard'
+
+_page_cache = {}
+cache_stats = {'hits': 0, 'misses': 0}
+
+def bump_leaderboard_generation():
+    """Record a change not visible in the scores (approvals, renames, avatars); caller commits."""
+    bump_counter(LEADERBOARD_COUNTER)
+
+def leaderboard_version():
+    """Return ``(version, last_modified)`` for the current leaderboard data.
+
+    Index lookups only, so it is cheap enough to run on every hit, 304s included.
+    """
+    counter = db.select(SharedCounter).where(SharedCounter.name == LEADERBOARD_COUNTER).subquery()
+    score_id, last_attempt, edits, edited_at = db.session.execute(db.select(
+        db.select(func.max(Score.id)).scalar_subquery(),
+        db.select(func.max(UserStats.last_attempt)).scalar_subquery(),
+        db.select(counter.c.value).scalar_subquery(),
+        db.select(counter.c.updated_at).scalar_subquery(),
+    )).one()
+    last_modified = max((t for t in (last_attempt, edited_at) if t is not None), default=None)
+    return (score_id, edits), last_modified
+
+def leaderboard_etag(version, *parts):
+    return hashlib.sha1(repr((version,) + parts).encode('utf-8')).hexdigest()
+
+def cached_leaderboard_page(sort, after, version):
+    """leaderboard_page() memoized until the data version changes or the TTL expires."""
+    sort = sort if sort in SORT_ORDERS else DEFAULT_SORT
+    key = (sort, after)
+    entry = _page_cache.get(key)
+    now = time.monotonic()
+    if entry is not None and entry[0] == version and now - entry[1] < CACHE_TTL:
+        cache_stats['hits'] += 1
+        return entry[2]
+    cache_stats['misses'] += 1
+    page = leaderboard_page(sort, after=after)
+    if len(_page_cache) >= CACHE_MAX_ENTRIES:
+        _page_cache.clear()
+    _page_cache[key] = (version, now, page)
+    return page
@@ -0,0 +1,130 @@
+# storage_backends.py
+"""Where profile pictures are stored and how their URLs are built.
+
+``STORAGE_BACKEND`` picks one of:
+
+- ``'supabase'``: objects go to the Supabase Storage bucket through the
+  streaming uploader (with the retry/breaker caller around it) and are
+  served by Supabase's CDN, which can also resize on the fly
+- ``'filesystem'``: objects are written under ``MEDIA_ROOT`` and served by
+  the app itself at ``MEDIA_URL_PATH``. Self-hosted deployments and
+  benchmarks skip the network hop entirely
+
+Both take ``save(stream, path, content_type, size, cache_control=None)``
+and return the public URL, so callers never need to know which one is
+active. Filesystem writes go to a temporary file in the target directory
+and are renamed into place, so readers never see a half-written image.
+Files are served with ``send_file``: ETag/Last-Modified conditional
+requests, the WSGI server's ``wsgi.file_wrapper`` (``sendfile(2)`` under
+gunicorn) or ``X-Sendfile`` when ``USE_X_SENDFILE`` is on.
+"""
+import os
+import tempfile
+
+from flask import abort, send_from_directory
+from werkzeug.security import safe_join
+
+from avatars import IMMUTABLE_CACHE_SECONDS
+
+BACKENDS = ('supabase', 'filesystem')
+
+
+class SupabaseStorage:
+    """Objects in a Supabase Storage bucket."""
+
+    def __init__(self, uploader, caller, supabase_url):
+        self.uploader = uploader
+        self.caller = caller
+        self.supabase_url = supabase_url
+        self._base_url = None
+
+    @property
+    def base_url(self):
+        # Built on first use: CLI commands import the app without SUPABASE_URL set
+        if self._base_url is None:
+            if not self.supabase_url:
+                raise RuntimeError('SUPABASE_URL is not set')
+            self._base_url = f"{self.supabase_url.rstrip('/')}/storage/v1/object/public/{self.uploader.bucket}/"
+        return self._base_url
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def save(self, stream, path, content_type, size, cache_control=None):
+        # upsert makes the upload idempotent, so transient failures are retried
+        self.caller.call('storage.upload', self.uploader.upload, stream, path, content_type, size,
+                         cache_control=cache_control)
+        return self.url(path)
+
+    def transform_url(self, url, width=None, height=None, quality=80):
+        """Ask the storage service to resize on the fly."""
+        params = [f"width={width}" if width else "",
+                  f"height={height}" if height else "",
+                  f"quality={quality}",
+                  "resize=cover"]
+        return f"{url}?{'&'.join(p for p in params if p)}"
+
+
+class FilesystemStorage:
+    """Objects in a local directory, served by the app."""
+
+    def __init__(self, root, url_path='/media/', read_size=64 * 1024, max_age=300):
+        self.root = os.path.abspath(root)
+        self.url_path = '/' + url_path.strip('/') + '/'
+        self.read_size = read_size
+        self.max_age = max_age  # for paths that can be overwritten, e.g. legacy <uid>/profile.png
+
+    def url(self, path):
+        return f"{self.url_path}{path}"
+
+    def _target(self, path):
+        target = safe_join(self.root, path)
+        if target is None:
+            raise ValueError(f'Unsafe storage path {path!r}')
+        return target
+
+    def save(self, stream, path, content_type=None, size=None, cache_control=None):
+        target = self._target(path)
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        # Same directory as the target, so the rename below is atomic
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                stream.seek(0)
+                for piece in iter(lambda: stream.read(self.read_size), b''):
+                    tmp.write(piece)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; a front proxy may serve these directly
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        stream.seek(0)
+        return self.url(path)
+
+    def transform_url(self, url, width=None, height=None, quality=80):
+        return url  # no resizing service; pictures with variants never get here
+
+    def send(self, path):
+        """Response for ``path``, or 404."""
+        if os.path.basename(path).startswith('.upload-'):
+            abort(404)  # in-progress writes
+        immutable = '/avatars/' in path  # content-hashed, see avatars.py
+        response = send_from_directory(self.root, path, conditional=True, etag=True,
+                                       max_age=IMMUTABLE_CACHE_SECONDS if immutable else self.max_age)
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+
+def create_storage(config, uploader, caller):
+    """The backend selected by ``STORAGE_BACKEND``."""
+    backend = config['STORAGE_BACKEND']
+    if backend == 'filesystem':
+        return FilesystemStorage(config['MEDIA_ROOT'], config['MEDIA_URL_PATH'],
+                                 read_size=config['UPLOAD_READ_SIZE'], max_age=config['MEDIA_MAX_AGE'])
+    if backend != 'supabase':
+        raise ValueError(f'Unknown STORAGE_BACKEND {backend!r}; expected one of {BACKENDS}')
+    return SupabaseStorage(uploader, caller, config['SUPABASE_URL'])
@@ -0,0 +1,220 @@
+# supabase_backends.py
+"""Auth/storage backends: real Supabase or an in-process stand-in.
+
+The app only uses a small slice of the supabase-py client, and any backend
+must provide the same shape:
+
+- ``auth.sign_up({'email', 'password', 'options'})`` -> response with ``.user``
+- ``auth.sign_in_with_password({'email', 'password'})`` -> ``.user`` and ``.session``
+- ``auth.sign_out()``
+- ``storage.from_(bucket).upload(path=..., file=..., file_options=...)``
+
+Streamed profile pictures go to the real client over raw HTTP (see uploads.py);
+the stand-in takes them through ``upload_stream`` instead.
+
+``SUPABASE_BACKEND = 'local'`` selects ``LocalSupabase``: users, sessions and
+objects live in process memory, access tokens are HS256 JWTs the token
+verifier accepts, and every call sleeps for a configurable latency (and can
+fail at a configurable rate) so whole-app load tests behave like they would
+against a remote Supabase without touching production.
+"""
+import hashlib
+import random
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import jwt
+# The gotrue/storage3 error types and httpx are imported where they are raised;
+# together they cost more at import than the rest of this module
+
+from supabase_transport import install_http_clients
+
+BACKENDS = ('supabase', 'local')
+
+
+class InjectedLatency:
+    """Sleep ``latency`` ± ``jitter`` seconds per call; fail ``error_rate`` of calls."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, sleep=time.sleep):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._sleep = sleep
+
+    def __call__(self, operation):
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if delay:
+            self._sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            # A dropped connection, raised the way the real client would so retries and the breaker kick in
+            import httpx
+            error = httpx.ConnectError(f'Injected failure in local Supabase {operation}')
+            if operation.startswith('auth.'):
+                from gotrue.errors import AuthRetryableError  # what gotrue wraps transport errors in
+                raise AuthRetryableError(str(error), 0) from error
+            raise error
+
+
+def _hash_password(password, salt):
+    return hashlib.sha256(salt + password.encode()).hexdigest()
+
+
+class LocalAuth:
+    """In-memory GoTrue: email/password users, HS256 access tokens, opaque refresh tokens."""
+
+    def __init__(self, jwt_secret, delay, token_ttl=3600):
+        self.jwt_secret = jwt_secret
+        self.token_ttl = token_ttl
+        self._delay = delay
+        self._users = {}           # email -> (user, salt, password_hash)
+        self._refresh_tokens = {}  # refresh_token -> user
+        self._lock = threading.Lock()
+
+    def _session(self, user):
+        now = int(time.time())
+        access_token = jwt.encode({'sub': user.id, 'email': user.email, 'aud': 'authenticated',
+                                   'role': 'authenticated', 'iat': now, 'exp': now + self.token_ttl},
+                                  self.jwt_secret, algorithm='HS256')
+        refresh_token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._refresh_tokens[refresh_token] = user
+        return SimpleNamespace(access_token=access_token, refresh_token=refresh_token,
+                               expires_in=self.token_ttl, expires_at=now + self.token_ttl,
+                               token_type='bearer', user=user)
+
+    def sign_up(self, credentials):
+        self._delay('auth.sign_up')
+        email = credentials['email'].lower()
+        with self._lock:
+            if email in self._users:
+                # Like Supabase, signing up again returns the existing user
+                return SimpleNamespace(user=self._users[email][0], session=None)
+            user = SimpleNamespace(
+                id=str(uuid.uuid4()), email=email, aud='authenticated', role='authenticated',
+                user_metadata=credentials.get('options', {}).get('data', {}),
+                created_at=datetime.now(timezone.utc))
+            salt = secrets.token_bytes(16)
+            self._users[email] = (user, salt, _hash_password(credentials['password'], salt))
+        return SimpleNamespace(user=user, session=None)
+
+    def sign_in_with_password(self, credentials):
+        self._delay('auth.sign_in_with_password')
+        entry = self._users.get(credentials['email'].lower())
+        if entry is None or _hash_password(credentials['password'], entry[1]) != entry[2]:
+            from gotrue.errors import AuthApiError
+            raise AuthApiError('Invalid login credentials', 400, 'invalid_credentials')
+        session = self._session(entry[0])
+        return SimpleNamespace(user=entry[0], session=session)
+
+    def sign_out(self, options=None):
+        self._delay('auth.sign_out')
+
+    def refresh_pair(self, refresh_token):
+        """``(access_token, refresh_token)`` for a refresh token; the old one is revoked."""
+        self._delay('auth.refresh')
+        with self._lock:
+            user = self._refresh_tokens.pop(refresh_token, None)
+        if user is None:
+            from gotrue.errors import AuthApiError
+            raise AuthApiError('Invalid Refresh Token', 400, 'refresh_token_not_found')
+        session = self._session(user)
+        return session.access_token, session.refresh_token
+
+
+class LocalBucket:
+    def __init__(self, storage, bucket):
+        self._storage = storage
+        self._bucket = bucket
+
+    def upload(self, path, file, file_options=None):
+        file_options = file_options or {}
+        self._storage._delay('storage.upload')
+        data = file if isinstance(file, bytes) else file.read()
+        key = (self._bucket, path)
+        with self._storage._lock:
+            if key in self._storage.objects and not file_options.get('upsert'):
+                from storage3.utils import StorageException
+                raise StorageException({'statusCode': 409, 'error': 'Duplicate',
+                                        'message': 'The resource already exists'})
+            self._storage.objects[key] = (data, file_options.get('content-type', 'application/octet-stream'))
+        return SimpleNamespace(path=path, full_path=f'{self._bucket}/{path}')
+
+    def upload_stream(self, path, chunks, content_type='application/octet-stream', upsert=False):
+        """Streaming variant used by uploads.StreamingUploader."""
+        return self.upload(path, b''.join(chunks), {'content-type': content_type, 'upsert': upsert})
+
+
+class LocalStorage:
+    """In-memory object store keyed by (bucket, path)."""
+
+    def __init__(self, delay):
+        self.objects = {}
+        self._delay = delay
+        self._lock = threading.Lock()
+
+    def from_(self, bucket):
+        return LocalBucket(self, bucket)
+
+
+class LocalSupabase:
+    """Drop-in for the supabase-py client slice the app uses (see module docstring)."""
+
+    def __init__(self, jwt_secret, latency=0.0, jitter=0.0, error_rate=0.0):
+        delay = InjectedLatency(latency, jitter, error_rate)
+        self.auth = LocalAuth(jwt_secret, delay)
+        self.storage = LocalStorage(delay)
+
+
+class LazyClient:
+    """Proxy that builds the client on first attribute access.
+
+    Creating the real client imports supabase-py (and through it httpx,
+    gotrue, postgrest, realtime and storage3), which dominates cold starts.
+    Requests that never touch auth or storage should not pay for it.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def local_jwt_secret(config):
+    """HS256 secret the stand-in signs access tokens with."""
+    return config.get('SUPABASE_JWT_SECRET') or config['SECRET_KEY']
+
+
+def create_supabase_client(config):
+    """The backend selected by ``SUPABASE_BACKEND``."""
+    backend = config['SUPABASE_BACKEND']
+    if backend == 'local':
+        return LocalSupabase(local_jwt_secret(config),
+                             latency=config['SUPABASE_LOCAL_LATENCY'],
+                             jitter=config['SUPABASE_LOCAL_JITTER'],
+                             error_rate=config['SUPABASE_LOCAL_ERROR_RATE'])
+    if backend != 'supabase':
+        raise ValueError(f'Unknown SUPABASE_BACKEND {backend!r}; expected one of {BACKENDS}')
+
+    if not (config.get('SUPABASE_URL') and config.get('SUPABASE_SERVICE_ROLE_KEY')):
+        print("⚠️  Missing Supabase URL or Service Role Key - uploads will fail")
+    from supabase import create_client
+    client = create_client(config['SUPABASE_URL'], config['SUPABASE_SERVICE_ROLE_KEY'])
+    return install_http_clients(client, config)  # pooled keep-alive connections with bounded timeouts
@@ -0,0 +1,214 @@
+# supabase_tokens.py
+"""Local verification and refresh of Supabase access tokens.
+
+Access tokens are JWTs signed by Supabase Auth. They are verified in-process
+against the project's JWKS (fetched once and cached) or the legacy HS256 JWT
+secret, so checking a request costs a signature check instead of an HTTP call
+to Supabase. Tokens close to expiry are refreshed inside the request that
+notices, so the new pair goes out in that response's session cookie: Supabase
+rotates refresh tokens, and a refreshed pair held anywhere else (another
+worker would keep sending the old refresh token) trips its reuse detection.
+
+JWKS fetches and refreshes share one pooled keep-alive client and go through
+the app's ``ResilientCaller``, so they count towards the circuit breaker and
+show up in the per-operation metrics like every other Supabase call.
+"""
+import threading
+import time
+from functools import wraps
+
+import jwt
+from flask import current_app, flash, redirect, request, session, url_for
+from flask_login import login_required, logout_user
+
+from supabase_backends import LazyClient
+from supabase_transport import ResilientCaller, build_http_client
+
+ASYMMETRIC_ALGORITHMS = ['RS256', 'ES256', 'EdDSA']
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class KeySet:
+    """JWKS cache: keys are fetched lazily, kept for ``ttl`` seconds and re-fetched on unknown kids."""
+
+    def __init__(self, url=None, jwks=None, ttl=600, fetch=None, min_refetch_interval=30,
+                 http=None, caller=None):
+        self.url = url
+        self.http = http or LazyClient(_default_http_client).get  # -> pooled httpx.Client
+        self.caller = caller or ResilientCaller()
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self._fetch = fetch or self._http_fetch
+        self._keys = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if jwks is not None:
+            self._load(jwks)
+
+    def _http_fetch(self):
+        return self.caller.call('auth.jwks', _get_json, self.http, self.url)
+
+    def _load(self, jwks):
+        keys = {}
+        for jwk in jwt.PyJWKSet.from_dict(jwks).keys:
+            keys[jwk.key_id] = jwk
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+
+    def get(self, kid):
+        now = time.monotonic()
+        stale = now - self._loaded_at > self.ttl
+        if (stale or kid not in self._keys) and self.url is not None:
+            with self._lock:
+                if now - self._loaded_at > self.min_refetch_interval or not self._keys:
+                    try:
+                        self._load(self._fetch())
+                    except Exception as e:  # keep serving cached keys if Supabase is unreachable
+                        print(f"JWKS fetch error: {e}")
+                        if not self._keys:
+                            raise InvalidToken('Signing keys unavailable') from e
+        try:
+            return self._keys[kid]
+        except KeyError:
+            raise InvalidToken(f'Unknown signing key {kid!r}')
+
+
+class TokenVerifier:
+    """Verify Supabase access tokens locally (signature, expiry, audience)."""
+
+    def __init__(self, keyset=None, secret=None, audience='authenticated', issuer=None, leeway=10):
+        self.keyset = keyset
+        self.secret = secret
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+
+    def verify(self, token):
+        """Return the token's claims, or raise InvalidToken."""
+        if not token:
+            raise InvalidToken('Missing access token')
+        try:
+            header = jwt.get_unverified_header(token)
+            if header.get('alg') == 'HS256':
+                if not self.secret:
+                    raise InvalidToken('HS256 token but no SUPABASE_JWT_SECRET configured')
+                key, algorithms = self.secret, ['HS256']
+            else:
+                if self.keyset is None:
+                    raise InvalidToken('No JWKS configured')
+                key, algorithms = self.keyset.get(header.get('kid')).key, ASYMMETRIC_ALGORITHMS
+            return jwt.decode(token, key, algorithms=algorithms, audience=self.audience,
+                              issuer=self.issuer, leeway=self.leeway,
+                              options={'require': ['exp', 'sub']})
+        except jwt.PyJWTError as e:
+            raise InvalidToken(str(e)) from e
+
+
+class TokenRefresher:
+    """Exchange a refresh token for a new ``(access, refresh)`` pair."""
+
+    def __init__(self, refresh, caller=None):
+        self._refresh = refresh  # refresh_token -> (access_token, refresh_token)
+        self.caller = caller or ResilientCaller()
+
+    def refresh(self, refresh_token):
+        """The new pair, or None on failure."""
+        try:
+            # Not retried: the token is single-use, a blind retry could trip reuse detection
+            return self.caller.call('auth.refresh', self._refresh, refresh_token, retry=False)
+        except Exception as e:
+            print(f"Supabase token refresh error: {e}")
+            return None
+
+
+def _default_http_client():
+    import httpx  # deferred, see supabase_transport
+    return httpx.Client(timeout=5.0)
+
+
+def _get_json(http, url):
+    response = http().get(url)
+    response.raise_for_status()  # 5xx -> HTTPStatusError, transient for the caller
+    return response.json()
+
+
+def gotrue_refresh(supabase_url, api_key, http):
+    """Build a stateless refresh function calling the GoTrue token endpoint directly."""
+    url = f"{supabase_url.rstrip('/')}/auth/v1/token?grant_type=refresh_token"
+    headers = {'apikey': api_key, 'Authorization': f'Bearer {api_key}'}
+
+    def refresh(refresh_token):
+        response = http().post(url, json={'refresh_token': refresh_token}, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        return data['access_token'], data['refresh_token']
+    return refresh
+
+
+class SupabaseTokenAuth:
+    """Flask glue: verifier + refresher configured from app.config."""
+
+    def __init__(self, app=None, verifier=None, refresher=None, caller=None):
+        self.verifier = verifier
+        self.refresher = refresher
+        if app is not None:
+            self.init_app(app, caller)
+
+    def init_app(self, app, caller=None):
+        """``caller`` is the app's ResilientCaller (breaker and metrics shared with other Supabase calls)."""
+        url = app.config.get('SUPABASE_URL')
+        http = LazyClient(lambda: build_http_client(app.config)).get  # httpx is imported on first use
+        if self.verifier is None:
+            jwks_url = app.config.get('SUPABASE_JWKS_URL') or (
+                f"{url.rstrip('/')}/auth/v1/.well-known/jwks.json" if url else None)
+            keyset = KeySet(jwks_url, ttl=app.config.get('SUPABASE_JWKS_CACHE_TTL', 600),
+                            http=http, caller=caller) if jwks_url else None
+            self.verifier = TokenVerifier(keyset=keyset, secret=app.config.get('SUPABASE_JWT_SECRET'))
+        if self.refresher is None and url:
+            api_key = app.config.get('SUPABASE_ANON_KEY') or app.config.get('SUPABASE_SERVICE_ROLE_KEY')
+            self.refresher = TokenRefresher(gotrue_refresh(url, api_key, http), caller)
+        app.extensions['supabase_token_auth'] = self
+
+    def check_session(self):
+        """Verify the session's access token, refreshing it when close to expiry; True if valid."""
+        try:
+            claims = self.verifier.verify(session.get('supabase_access_token'))
+        except InvalidToken:
+            claims = None
+        margin = current_app.config.get('SUPABASE_TOKEN_REFRESH_MARGIN', 300)
+        if claims is not None and claims['exp'] - time.time() >= margin:
+            return True
+
+        # Expired or about to: one blocking refresh, about once an hour per session
+        refresh_token = session.get('supabase_refresh_token')
+        fresh = self.refresher.refresh(refresh_token) if self.refresher and refresh_token else None
+        if not fresh:
+            return claims is not None  # still valid for now; the next request tries again
+        session['supabase_access_token'], session['supabase_refresh_token'] = fresh
+        try:
+            self.verifier.verify(fresh[0])
+        except InvalidToken:
+            return False
+        return True
+
+
+def supabase_login_required(view):
+    """``login_required`` that also verifies the Supabase access token locally.
+
+    Token checks only run when SUPABASE_VERIFY_TOKENS is enabled; otherwise
+    this behaves exactly like Flask-Login's ``login_required``.
+    """
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if current_app.config.get('SUPABASE_VERIFY_TOKENS'):
+            auth = current_app.extensions['supabase_token_auth']
+            if not auth.check_session():
+                logout_user()
+                flash('Your session has expired. Please log in again.', 'warning')
+                return redirect(url_for('login', next=request.path))
+        return view(*args, **kwargs)
+    return wrapped
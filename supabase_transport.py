@@ -0,0 +1,210 @@
+# supabase_transport.py
+"""Resilient HTTP transport for the Supabase client.
+
+- pooled, keep-alive ``httpx.Client``s for the auth and storage APIs
+- per-call timeouts taken from ``Config``
+- bounded retries with full-jitter exponential backoff for transient errors
+- a circuit breaker that fails fast while Supabase is degraded
+- per-operation latency / error metrics
+"""
+import random
+import threading
+import time
+
+# httpx is imported where it is used: it is one of the slowest imports of a
+# cold start, and requests that never reach Supabase should not pay for it
+
+
+class SupabaseUnavailable(Exception):
+    """Raised instead of calling Supabase while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker counting consecutive failures.
+
+    Half-open admits a single trial call; the others keep failing fast until
+    it succeeds (closing the breaker) or fails (re-opening it).
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return state == 'closed'
+
+    def release(self):
+        """End a trial call that proved nothing either way (e.g. a 4xx answer)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class OperationMetrics:
+    """Call count, error count, total latency and a latency histogram per operation."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def observe(self, operation, seconds, error=False):
+        with self._lock:
+            op = self._ops.setdefault(operation, {'count': 0, 'errors': 0, 'sum': 0.0,
+                                                  'buckets': [0] * len(self.buckets)})
+            op['count'] += 1
+            op['errors'] += int(error)
+            op['sum'] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    op['buckets'][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: {**op, 'buckets': list(op['buckets'])} for name, op in self._ops.items()}
+
+
+def _retryable_error_types():
+    import httpx
+    types = (httpx.TransportError, httpx.TimeoutException)
+    try:
+        # gotrue turns connection errors and timeouts into AuthRetryableError(status=0)
+        from gotrue.errors import AuthRetryableError
+    except ImportError:
+        return types
+    return types + (AuthRetryableError,)
+
+
+def is_transient(exc):
+    """Network failures, timeouts and 5xx responses are worth retrying.
+
+    Client libraries re-raise transport errors as their own types, so the
+    ``__cause__``/``__context__`` chain is checked as well.
+    """
+    import httpx
+    retryable = _retryable_error_types()
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, retryable):
+            return True
+        status = getattr(exc, 'status', None) or getattr(exc, 'status_code', None)
+        if isinstance(exc, httpx.HTTPStatusError):
+            status = exc.response.status_code
+        try:
+            if int(status) >= 500:
+                return True
+        except (TypeError, ValueError):
+            pass
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class ResilientCaller:
+    """Run Supabase calls with retries, a circuit breaker and metrics."""
+
+    def __init__(self, retries=2, backoff_base=0.2, backoff_max=2.0,
+                 breaker=None, metrics=None, sleep=time.sleep):
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or OperationMetrics()
+        self._sleep = sleep
+
+    def call(self, operation, fn, *args, retry=True, **kwargs):
+        """Call ``fn(*args, **kwargs)``; ``retry=False`` for non-idempotent operations."""
+        attempts = 1 + (self.retries if retry else 0)
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self.metrics.observe(operation, 0.0, error=True)
+                raise SupabaseUnavailable(f'Supabase circuit open; skipped {operation}')
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.metrics.observe(operation, time.perf_counter() - start, error=True)
+                if not is_transient(e):
+                    self.breaker.release()
+                    raise  # e.g. wrong password: Supabase is healthy, don't trip the breaker
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                # Full jitter: sleep uniformly in [0, min(max, base * 2^attempt)]
+                self._sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            else:
+                self.metrics.observe(operation, time.perf_counter() - start)
+                self.breaker.record_success()
+                return result
+
+
+def build_http_client(config, **kwargs):
+    """Pooled keep-alive client sized and timed from app config."""
+    import httpx
+    return httpx.Client(
+        **kwargs,
+        limits=httpx.Limits(max_connections=config['SUPABASE_HTTP_MAX_CONNECTIONS'],
+                            max_keepalive_connections=config['SUPABASE_HTTP_MAX_KEEPALIVE'],
+                            keepalive_expiry=config['SUPABASE_HTTP_KEEPALIVE_EXPIRY']),
+        timeout=httpx.Timeout(config['SUPABASE_HTTP_TIMEOUT'],
+                              connect=config['SUPABASE_HTTP_CONNECT_TIMEOUT']),
+        follow_redirects=True,
+    )
+
+
+def install_http_clients(client, config):
+    """Swap pooled clients into the supabase-py auth and storage APIs.
+
+    supabase-py 2.9 builds its own httpx clients with default limits and
+    timeouts; these attributes are where gotrue 2.x and storage3 0.8 keep them.
+    """
+    auth = client.auth
+    if hasattr(auth, '_http_client'):
+        auth._http_client = build_http_client(config)
+    storage = client.storage
+    if hasattr(storage, 'session'):
+        pooled = build_http_client(config, base_url=storage.session.base_url,
+                                   headers=storage.session.headers)
+        storage.session = pooled
+        storage._client = pooled
+    return client
+
+
+def build_caller(config):
+    return ResilientCaller(
+        retries=config['SUPABASE_RETRIES'],
+        backoff_base=config['SUPABASE_BACKOFF_BASE'],
+        breaker=CircuitBreaker(config['SUPABASE_BREAKER_THRESHOLD'], config['SUPABASE_BREAKER_RESET']),
+    )
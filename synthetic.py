@@ -0,0 +1,103 @@
+# synthetic.py
+"""Bulk generator of synthetic students and scores for benchmarks.
+
+Rows are written with Core ``insert`` executemany batches (multi-row
+VALUES on Postgres), never one ORM object per row, so 100k users and
+10M scores load in minutes. The aggregates and rollups are rebuilt
+afterwards with the same set-based backfills the CLI uses.
+
+Distributions are deliberately uneven, like a real academy:
+
+- each student has a fixed ability, so their scores cluster
+- activity follows a heavy tail: a few students take many exams
+- categories are weighted, and section1 is taken more often than section2
+- attempts lean towards recent days and fall in school hours
+"""
+import random
+import secrets
+import time
+from datetime import datetime, timezone
+
+from models import db, User, Score, rebuild_user_stats, rebuild_rollups
+from questions import question_bank
+
+SECTION_WEIGHTS = {'section1': 0.6, 'section2': 0.4}
+
+
+def _category_weights(categories):
+    # First categories are the popular ones: weights 1, 1/2, 1/3 ...
+    return [1 / (i + 1) for i in range(len(categories))]
+
+
+def _attempt_time(rng, today, now, days):
+    """A timestamp in the last ``days`` days, denser near today, between 08:00 and 20:00 UTC.
+
+    ``today`` and ``now`` are epoch seconds (UTC midnight and the current time).
+    """
+    moment = today - 86400 * int(days * rng.random() ** 1.7) + 3600 * (8 + 12 * rng.random())
+    return datetime.fromtimestamp(min(moment, now), timezone.utc)
+
+
+def generate_dataset(students, scores, pending_ratio=0.05, days=365, seed=None,
+                     batch_size=20000, rebuild=True, log=print):
+    """Insert ``students`` users and ``scores`` Score rows; returns the new approved user ids."""
+    rng = random.Random(seed)
+    run = secrets.token_hex(3)  # keeps usernames unique across repeated runs
+    now = time.time()
+    today = now - now % 86400
+    started = time.perf_counter()
+
+    # Core inserts on the session's connection skip the ORM bulk-insert bookkeeping
+    connection = db.session.connection()
+    pending = int(students * pending_ratio)
+    for start in range(0, students, batch_size):
+        connection.execute(User.__table__.insert(), [
+            {'supabase_uid': f'synthetic-{run}-{i}', 'username': f'synth_{run}_{i}',
+             'email': f'synth_{run}_{i}@example.com', 'role': 'student', 'approved': i >= pending}
+            for i in range(start, min(start + batch_size, students))])
+    ids = db.session.execute(
+        db.select(User.id).where(User.supabase_uid.like(f'synthetic-{run}-%'), User.approved.is_(True))
+        .order_by(User.id)
+    ).scalars().all()
+    log(f"  {students} students ({pending} pending) in {time.perf_counter() - started:.1f}s")
+    if not ids or not scores:
+        db.session.commit()
+        return ids
+
+    # Per-student ability and a heavy-tailed activity weight
+    ability = [rng.betavariate(5, 3) for _ in ids]
+    cum_activity, total = [], 0.0
+    for _ in ids:
+        total += rng.paretovariate(1.5)
+        cum_activity.append(total)
+
+    sections = [(category, section, len(question_bank.section(category, section)) or 20)
+                for category in question_bank.categories for section in SECTION_WEIGHTS]
+    category_weight = dict(zip(question_bank.categories, _category_weights(question_bank.categories)))
+    cum_sections, total = [], 0.0
+    for category, section, _ in sections:
+        total += category_weight[category] * SECTION_WEIGHTS[section]
+        cum_sections.append(total)
+
+    written = 0
+    while written < scores:
+        count = min(batch_size, scores - written)
+        students_idx = rng.choices(range(len(ids)), cum_weights=cum_activity, k=count)
+        picks = rng.choices(sections, cum_weights=cum_sections, k=count)
+        rows = []
+        for idx, (category, section, questions) in zip(students_idx, picks):
+            score = round(rng.gauss(ability[idx] * questions, questions * 0.12))
+            rows.append({'user_id': ids[idx], 'category': f'{category}_{section}',
+                         'score': min(max(score, 0), questions), 'date': _attempt_time(rng, today, now, days)})
+        connection.execute(Score.__table__.insert(), rows)
+        written += count
+        if written % (batch_size * 25) == 0 or written == scores:
+            log(f"  {written} scores in {time.perf_counter() - started:.1f}s")
+    db.session.commit()
+
+    if rebuild:
+        rebuild_user_stats()
+        log(f"  stats rebuilt in {time.perf_counter() - started:.1f}s")
+        rebuild_rollups(batch_size)
+        log(f"  rollups rebuilt in {time.perf_counter() - started:.1f}s")
+    return ids
@@ -0,0 +1,87 @@
+# timeseries.py
+"""Downsampling and compact encoding for time series sent to Chart.js.
+
+Series are reduced server-side to a target number of points, either with
+Largest-Triangle-Three-Buckets (keeps the visual shape) or min/max bucketing
+(keeps extremes), and encoded as parallel arrays: epoch milliseconds in
+``t`` and values in ``y`` instead of one formatted label string per point.
+"""
+from datetime import datetime, timezone
+
+
+def lttb_indices(xs, ys, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps (first and last always)."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def minmax_indices(xs, ys, threshold):
+    """Indices of the min and max point of each bucket (about ``threshold`` points total)."""
+    n = len(xs)
+    if threshold >= n or threshold < 2:
+        return list(range(n))
+
+    buckets = max(threshold // 2, 1)
+    every = n / buckets
+    selected = []
+    for i in range(buckets):
+        start, end = int(i * every), int((i + 1) * every)
+        if start >= end:
+            continue
+        window = range(start, end)
+        low = min(window, key=ys.__getitem__)
+        high = max(window, key=ys.__getitem__)
+        selected.extend(sorted({low, high}))
+    return selected
+
+
+DOWNSAMPLERS = {'lttb': lttb_indices, 'minmax': minmax_indices}
+
+
+def epoch_ms(value):
+    """Milliseconds since the epoch for a date (UTC midnight) or datetime."""
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def compact_series(times, values, max_points=None, method='lttb', extra=None):
+    """Downsample ``times``/``values`` and encode them as ``{'t': [...], 'y': [...]}``.
+
+    ``extra`` maps payload keys to arrays parallel to ``values`` (counts,
+    min, max ...); they are reduced with the same selected indices.
+    """
+    t = [epoch_ms(value) for value in times]
+    y = list(values)
+    indices = DOWNSAMPLERS[method](t, y, max_points) if max_points else range(len(t))
+    payload = {'t': [t[i] for i in indices], 'y': [y[i] for i in indices]}
+    for key, column in (extra or {}).items():
+        payload[key] = [column[i] for i in indices]
+    return payload
@@ -0,0 +1,64 @@
+# trends.py
+"""Score trend series read from the rollup tables.
+
+Charts never see individual Score rows: each point is one day or one week
+bucket (count, average, min, max), and the bucket size is picked from the
+requested range so payloads stay bounded however many attempts accumulate.
+Series are then downsampled to at most ``max_points`` and sent in the
+compact ``t``/``y`` format from timeseries.py.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from models import db, ScoreRollup, UserScoreRollup
+from timeseries import compact_series
+
+DAY_BUCKET_MAX_DAYS = 92  # Ranges up to ~3 months use daily points, longer ones weekly
+
+
+def choose_period(days=None, first_bucket=None):
+    """Pick 'day' or 'week' for a range of ``days`` (or the data span if None)."""
+    if days is None and first_bucket is not None:
+        days = (datetime.now(timezone.utc).date() - first_bucket).days
+    return 'day' if days is None or days <= DAY_BUCKET_MAX_DAYS else 'week'
+
+
+def _series(model, filters, days, max_points=None, method='lttb'):
+    since = datetime.now(timezone.utc).date() - timedelta(days=days) if days else None
+    if days is None:
+        first_bucket = db.session.execute(
+            db.select(func.min(model.bucket_start)).where(model.period == 'day', *filters)
+        ).scalar()
+        period = choose_period(first_bucket=first_bucket)
+    else:
+        period = choose_period(days)
+
+    query = (db.select(model.bucket_start, func.sum(model.count), func.sum(model.total),
+                       func.min(model.min_score), func.max(model.max_score))
+             .where(model.period == period, *filters)
+             .group_by(model.bucket_start)
+             .order_by(model.bucket_start))
+    if since is not None:
+        query = query.where(model.bucket_start >= since)
+
+    rows = db.session.execute(query).all()
+    series = compact_series([start for start, *_ in rows],
+                            [round(total / count, 1) for _, count, total, _, _ in rows],
+                            max_points=max_points, method=method,
+                            extra={'n': [count for _, count, *_ in rows],
+                                   'min': [low for *_, low, _ in rows],
+                                   'max': [high for *_, high in rows]})
+    series['bucket'] = period
+    return series
+
+
+def academy_trend(days=None, category=None, max_points=None, method='lttb'):
+    """Average score per bucket across the academy (optionally one category)."""
+    filters = [ScoreRollup.category == category] if category else []
+    return _series(ScoreRollup, filters, days, max_points, method)
+
+
+def user_trend(user_id, days=None, max_points=None, method='lttb'):
+    """Average score per bucket for one student."""
+    return _series(UserScoreRollup, [UserScoreRollup.user_id == user_id], days, max_points, method)
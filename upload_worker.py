@@ -0,0 +1,194 @@
+# upload_worker.py
+"""Background processing of profile-picture uploads.
+
+The request validates the picture, stores it in an ``UploadJob`` row and
+returns at once. A small thread pool then uploads it (and generates the
+avatar variants) and points ``User.profile_pic`` at the result. Jobs are
+claimed with a conditional UPDATE, so a job is never processed twice. A
+failed job is retried after ``UPLOAD_RETRY_DELAY`` seconds, doubled per
+attempt. Jobs left pending (a retry that found the pool full, a restart) or
+stuck running are requeued by ``recover()``, which runs on the pool at most
+every ``UPLOAD_RECOVER_INTERVAL`` seconds, triggered by requests so start-up
+never waits on the database.
+When the pool is saturated the job runs inline in the request instead, which
+keeps the queue bounded.
+"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from models import db, User, UploadJob
+from uploads import UploadBusy
+
+
+class UploadWorker:
+    """Bounded in-process worker pool for UploadJob rows."""
+
+    def __init__(self, app=None, process=None, on_change=None, on_done=None):
+        self.process = process      # (stream, supabase_uid, ext, mimetype, size) -> public URL
+        self.on_change = on_change  # user_id -> None, in the transaction that changes profile_pic
+        self.on_done = on_done      # user_id -> None, after that transaction commits
+        self._in_flight = 0
+        self._recovered_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_pending = app.config['UPLOAD_QUEUE_SIZE']
+        self.max_attempts = app.config['UPLOAD_MAX_ATTEMPTS']
+        self.retry_delay = app.config['UPLOAD_RETRY_DELAY']
+        self.recover_interval = app.config['UPLOAD_RECOVER_INTERVAL']
+        self.stale_after = timedelta(seconds=app.config['UPLOAD_STALE_AFTER'])
+        self.slot_wait = app.config['UPLOAD_SLOT_WAIT']
+        self._slots = threading.BoundedSemaphore(app.config['UPLOAD_MAX_CONCURRENT'])
+        self._executor = ThreadPoolExecutor(max_workers=app.config['UPLOAD_WORKERS'],
+                                            thread_name_prefix='upload-worker')
+        if app.config['UPLOAD_ASYNC']:
+            app.before_request(self._recover_if_due)
+        app.extensions['upload_worker'] = self
+
+    def _recover_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._recovered_at is not None and now - self._recovered_at < self.recover_interval:
+                return
+            self._recovered_at = now
+        self._executor.submit(self._recover_in_context)
+
+    def _recover_in_context(self):
+        try:
+            with self.app.app_context():
+                self.recover()
+        except Exception as e:
+            print(f"Upload worker recovery error: {e}")
+
+    def enqueue(self, user_id, ext, mimetype, stream):
+        """Persist a job and hand it to the pool (or run it now if the pool is full).
+
+        The picture is read into memory for the row, so this takes one of
+        ``UPLOAD_MAX_CONCURRENT`` slots; raises UploadBusy if none frees up.
+        """
+        if not self._slots.acquire(timeout=self.slot_wait):
+            raise UploadBusy('Too many uploads in progress')
+        try:
+            stream.seek(0)
+            job = UploadJob(user_id=user_id, ext=ext, mimetype=mimetype, data=stream.read())
+            db.session.add(job)
+            db.session.commit()  # expires job.data, so the bytes are not held past this point
+        finally:
+            self._slots.release()
+        if not self.submit(job.id):
+            self.run_job(job.id)
+        return job
+
+    def submit(self, job_id):
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                return False
+            self._in_flight += 1
+        self._executor.submit(self._run_in_context, job_id)
+        return True
+
+    def _run_in_context(self, job_id):
+        try:
+            with self.app.app_context():
+                self.run_job(job_id)
+        except Exception as e:
+            print(f"Upload worker error (job {job_id}): {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def run_job(self, job_id):
+        """Claim and process one job; returns its final status, or None if someone else has it."""
+        claimed = db.session.execute(
+            db.update(UploadJob)
+            .where(UploadJob.id == job_id, UploadJob.status == 'pending')
+            .values(status='running', attempts=UploadJob.attempts + 1,
+                    updated_at=datetime.now(timezone.utc))
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return None
+
+        job = db.session.get(UploadJob, job_id)
+        user = db.session.get(User, job.user_id)
+        try:
+            url = self.process(io.BytesIO(job.data), user.supabase_uid, job.ext, job.mimetype, len(job.data))
+        except Exception as e:
+            print(f"Upload job {job_id} failed (attempt {job.attempts}): {e}")
+            job.error = str(e)[:500]
+            job.status = 'pending' if job.attempts < self.max_attempts else 'failed'
+            db.session.commit()
+            if job.status == 'pending':
+                self._retry_later(job_id, self.backoff(job.attempts))
+            return job.status
+
+        # A newer picture that already finished wins over this one
+        newer = db.session.execute(
+            db.select(UploadJob.id).where(UploadJob.user_id == user.id, UploadJob.id > job.id,
+                                          UploadJob.status == 'done').limit(1)
+        ).first()
+        if newer is None:
+            user.profile_pic = url
+            if self.on_change is not None:
+                self.on_change(user.id)
+        job.status, job.data, job.error = 'done', None, None
+        db.session.commit()
+        if self.on_done is not None:
+            self.on_done(user.id)
+        return job.status
+
+    def backoff(self, attempts):
+        """Seconds to wait after ``attempts`` failed attempts."""
+        return self.retry_delay * 2 ** (attempts - 1)
+
+    def _retry_later(self, job_id, delay):
+        # A full pool leaves the job pending for the next recover()
+        timer = threading.Timer(delay, self.submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _due_jobs(self):
+        """Pending jobs whose retry delay has passed, oldest first."""
+        now = datetime.now(timezone.utc)
+        rows = db.session.execute(
+            db.select(UploadJob.id, UploadJob.attempts, UploadJob.updated_at)
+            .where(UploadJob.status == 'pending').order_by(UploadJob.id)
+        ).all()
+        due = []
+        for job_id, attempts, updated in rows:
+            updated = updated if updated.tzinfo else updated.replace(tzinfo=timezone.utc)
+            if not attempts or now - updated >= timedelta(seconds=self.backoff(attempts)):
+                due.append(job_id)
+        return due
+
+    def recover(self):
+        """Requeue due pending jobs and jobs left running by a process that died."""
+        stale = datetime.now(timezone.utc) - self.stale_after
+        db.session.execute(
+            db.update(UploadJob)
+            .where(UploadJob.status == 'running', UploadJob.updated_at < stale)
+            .values(status='pending')
+        )
+        db.session.commit()
+        job_ids = self._due_jobs()
+        for job_id in job_ids:
+            if not self.submit(job_id):
+                break  # the rest are picked up by the next recover() or `flask process-uploads`
+        return len(job_ids)
+
+    def drain(self):
+        """Process every due pending job in the calling thread (CLI / cron)."""
+        done = 0
+        while True:
+            job_ids = self._due_jobs()
+            if not job_ids:
+                return done
+            for job_id in job_ids:
+                if self.run_job(job_id) == 'done':
+                    done += 1
@@ -0,0 +1,160 @@
+# uploads.py
+"""Streaming profile-picture uploads to Supabase Storage.
+
+Werkzeug already spools large multipart files to a temporary file, so the
+upload is read back in ``UPLOAD_READ_SIZE`` pieces and forwarded as a
+streamed request body; the whole image is never held in memory.
+
+- files up to ``UPLOAD_CHUNK_SIZE`` go up in one streamed POST
+- larger files use Supabase's TUS resumable endpoint; each chunk is also
+  streamed, and after a dropped connection the upload resumes from the
+  offset the server reports instead of starting over
+- a semaphore caps concurrent uploads per worker, so upload memory stays
+  below ``UPLOAD_MAX_CONCURRENT * UPLOAD_READ_SIZE`` however many arrive
+- the image type is sniffed from the first bytes; the filename's
+  extension is not trusted
+"""
+import base64
+import threading
+
+from supabase_transport import is_transient
+
+# (magic prefix, offset, extension, mime type)
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 0, 'png', 'image/png'),
+    (b'\xff\xd8\xff', 0, 'jpg', 'image/jpeg'),
+    (b'GIF87a', 0, 'gif', 'image/gif'),
+    (b'GIF89a', 0, 'gif', 'image/gif'),
+    (b'WEBP', 8, 'webp', 'image/webp'),  # RIFF....WEBP
+)
+SNIFF_BYTES = 16
+TUS_VERSION = '1.0.0'
+
+
+class UploadRejected(Exception):
+    """The file is empty, too large or not a supported image."""
+
+
+class UploadBusy(Exception):
+    """Too many uploads in flight on this worker."""
+
+
+def sniff_image_type(head):
+    """``(extension, mime type)`` from the first bytes of a file, or None."""
+    for magic, offset, ext, mime in IMAGE_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if ext == 'webp' and head[:4] != b'RIFF':
+                continue
+            return ext, mime
+    return None
+
+
+def iter_chunks(stream, length, read_size):
+    """Yield up to ``length`` bytes from the current position in ``read_size`` pieces."""
+    remaining = length
+    while remaining > 0:
+        piece = stream.read(min(read_size, remaining))
+        if not piece:
+            break
+        remaining -= len(piece)
+        yield piece
+
+
+class StreamingUploader:
+    """Stream file objects into a bucket of ``client`` (supabase-py or LocalSupabase)."""
+
+    def __init__(self, client, bucket, chunk_size=6 * 1024 * 1024, read_size=64 * 1024,
+                 max_concurrent=4, wait=5.0, retries=3, max_size=None):
+        self.client = client
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.read_size = read_size
+        self.retries = retries
+        self.max_size = max_size
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    @classmethod
+    def from_config(cls, client, bucket, config):
+        return cls(client, bucket,
+                   chunk_size=config['UPLOAD_CHUNK_SIZE'], read_size=config['UPLOAD_READ_SIZE'],
+                   max_concurrent=config['UPLOAD_MAX_CONCURRENT'], wait=config['UPLOAD_SLOT_WAIT'],
+                   max_size=config.get('MAX_CONTENT_LENGTH'))
+
+    def inspect(self, stream):
+        """Validate an uploaded file; returns ``(extension, mime type, size)``."""
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(0)
+        if size == 0:
+            raise UploadRejected('Empty file')
+        if self.max_size and size > self.max_size:
+            raise UploadRejected('File too large')
+        kind = sniff_image_type(stream.read(SNIFF_BYTES))
+        stream.seek(0)
+        if kind is None:
+            raise UploadRejected('Not a PNG, JPEG, GIF or WebP image')
+        return kind[0], kind[1], size
+
+    def upload(self, stream, path, content_type, size, upsert=True, cache_control=None):
+        if not self._slots.acquire(timeout=self.wait):
+            raise UploadBusy('Too many uploads in progress')
+        try:
+            bucket = self.client.storage.from_(self.bucket)
+            if hasattr(bucket, 'upload_stream'):  # local stand-in
+                stream.seek(0)
+                return bucket.upload_stream(path, iter_chunks(stream, size, self.read_size),
+                                            content_type=content_type, upsert=upsert)
+            if size <= self.chunk_size:
+                return self._upload_single(stream, path, content_type, size, upsert, cache_control)
+            return self._upload_resumable(stream, path, content_type, size, upsert, cache_control)
+        finally:
+            self._slots.release()
+
+    def _session(self):
+        return self.client.storage.session  # base_url .../storage/v1/, carries the API key headers
+
+    def _upload_single(self, stream, path, content_type, size, upsert, cache_control):
+        stream.seek(0)
+        headers = {'Content-Type': content_type, 'Content-Length': str(size),
+                   'x-upsert': 'true' if upsert else 'false'}
+        if cache_control:
+            headers['cache-control'] = f'max-age={cache_control}'
+        response = self._session().post(f'object/{self.bucket}/{path}',
+                                        content=iter_chunks(stream, size, self.read_size), headers=headers)
+        response.raise_for_status()
+        return response
+
+    def _upload_resumable(self, stream, path, content_type, size, upsert, cache_control):
+        import httpx  # deferred, see supabase_transport
+        session = self._session()
+        metadata = {'bucketName': self.bucket, 'objectName': path, 'contentType': content_type}
+        if cache_control:
+            metadata['cacheControl'] = str(cache_control)
+        response = session.post('upload/resumable', headers={
+            'Tus-Resumable': TUS_VERSION, 'Upload-Length': str(size),
+            'x-upsert': 'true' if upsert else 'false',
+            'Upload-Metadata': ','.join(f'{k} {base64.b64encode(v.encode()).decode()}'
+                                        for k, v in metadata.items())})
+        response.raise_for_status()
+        location = response.headers['Location']
+
+        offset, failures = 0, 0
+        while offset < size:
+            length = min(self.chunk_size, size - offset)
+            stream.seek(offset)
+            try:
+                response = session.patch(location, content=iter_chunks(stream, length, self.read_size), headers={
+                    'Tus-Resumable': TUS_VERSION, 'Upload-Offset': str(offset),
+                    'Content-Type': 'application/offset+octet-stream', 'Content-Length': str(length)})
+                response.raise_for_status()
+                offset = int(response.headers.get('Upload-Offset', offset + length))
+            except httpx.HTTPError as e:
+                failures += 1
+                if failures > self.retries or not is_transient(e):
+                    raise
+                # Resume from whatever the server actually stored
+                head = session.head(location, headers={'Tus-Resumable': TUS_VERSION})
+                head.raise_for_status()
+                offset = int(head.headers['Upload-Offset'])
+        return response
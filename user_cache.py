@@ -0,0 +1,114 @@
+# user_cache.py
+"""Process-local cache of the user snapshots Flask-Login hands out as current_user.
+
+``load_user`` runs on every authenticated request; caching a detached
+snapshot (id, username, email, role, approved, profile_pic, supabase_uid)
+skips the database round trip in the common case. Entries expire after a
+TTL and are dropped early when ``invalidate_user`` bumps the user's version
+stamp (approval, rejection, profile edits, new picture). A version is only
+kept while the user has an entry or a load in flight, so the stamps stay
+bounded by ``maxsize`` plus concurrent requests.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from werkzeug.local import LocalProxy
+
+from models import db, User
+
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'role', 'approved', 'profile_pic', 'supabase_uid')
+
+
+class CachedUser(UserMixin):
+    """Read-only stand-in for a User row; use ``.model`` to load the row for writes."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(**{name: getattr(user, name) for name in SNAPSHOT_FIELDS})
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def model(self):
+        return db.session.get(User, self.id)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username} role={self.role} approved={self.approved}>'
+
+
+class UserCache:
+    """Bounded LRU of CachedUser snapshots with a TTL and per-user version stamps."""
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (snapshot, version, expires_at)
+        self._versions = {}            # user_id -> version, for users with an entry or a load
+        self._loading = {}             # user_id -> loads in flight
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Cached snapshot for ``user_id``, loading it from the database on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                snapshot, version, expires_at = entry
+                if version == self._versions.get(user_id, 0) and now < expires_at:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return snapshot
+                del self._entries[user_id]
+            self.misses += 1
+            version = self._versions.get(user_id, 0)
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+
+        try:
+            user = db.session.get(User, user_id)
+            snapshot = CachedUser.from_model(user) if user is not None else None
+        finally:
+            with self._lock:
+                if self._loading[user_id] == 1:
+                    del self._loading[user_id]
+                else:
+                    self._loading[user_id] -= 1
+                if snapshot is not None and version == self._versions.get(user_id, 0):  # not invalidated meanwhile
+                    self._entries[user_id] = (snapshot, version, now + self.ttl)
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.maxsize:
+                        self._forget(self._entries.popitem(last=False)[0])
+                self._forget(user_id)
+        return snapshot
+
+    def _forget(self, user_id):
+        # Caller holds the lock; a version only matters while something can be stale
+        if user_id not in self._entries and user_id not in self._loading:
+            self._versions.pop(user_id, None)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+            self._forget(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions = {user_id: v for user_id, v in self._versions.items() if user_id in self._loading}
+
+
+# Each app has its own cache (see create_app); this resolves to the current app's
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
+
+def invalidate_user(user_id):
+    """Drop a user's cached snapshot after changing their row."""
+    user_cache.invalidate(user_id)